@@ -1,53 +1,44 @@
 import asyncio
 import logging
+
+# Layihə modulları import olunanda log yazır (məs. config) — handler əvvəlcədən qurulmalıdır
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.types import BotCommand
 
 from config import settings
-from db import init_db, SessionLocal
+from db import init_db
+from i18n import warm_locales
+from keyboards import warm_keyboards
 from handlers import setup_routers
-from models import User
-from sqlalchemy import select
-
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+from services.request_log import run_request_log_writer
+from services.user_service import run_last_seen_writer
 
 
-# 🔍 İstifadəçinin dili
-async def get_user_lang(user_id: int) -> str:
-    async with SessionLocal() as s:
-        u = (
-            await s.execute(select(User).where(User.tg_id == user_id))
-        ).scalars().first()
-        return u.language if u and u.language else "az"
+# 🔧 BOT KOMANDALARI — PLAYLISTS VƏ SEARCH SİLİNDİ
+BOT_COMMANDS = [
+    BotCommand(command="start", description="🚀 Başlat"),
+    BotCommand(command="favorites", description="⭐ Sevimlilər"),
+    BotCommand(command="lang", description="🌐 Dili dəyiş"),
+    BotCommand(command="help", description="ℹ️ Kömək"),
+]
 
 
-# 🔧 BOT KOMANDALARINI TƏYİN ET — PLAYLISTS VƏ SEARCH SİLİNDİ
-async def set_bot_commands(bot: Bot, user_id: int | None = None):
-    lang = await get_user_lang(user_id) if user_id else "az"
-
-    d = {
-        "start": "🚀 Başlat",
-        "favorites": "⭐ Sevimlilər",
-        "lang": "🌐 Dili dəyiş",
-        "help": "ℹ️ Kömək",
-    }
-
-    commands = [
-        BotCommand(command="start", description=d["start"]),
-        BotCommand(command="favorites", description=d["favorites"]),
-        BotCommand(command="lang", description=d["lang"]),
-        BotCommand(command="help", description=d["help"]),
-    ]
-
-    await bot.set_my_commands(commands)
-    logging.info(f"✅ Telegram komanda list yeniləndi. Dil: {lang.upper()}")
+async def set_bot_commands(bot: Bot):
+    # Komandalar qlobaldır (scope yoxdur) — start zamanı bir dəfə təyin olunur
+    await bot.set_my_commands(BOT_COMMANDS)
+    logging.info("✅ Telegram komanda list yeniləndi.")
 
 
 # 🚀 BOT START
 async def main():
     await init_db()
+    # Dil faylları və əsas menyular start zamanı hazırlanır — ilk mesaj heç nə qurmur
+    warm_locales()
+    warm_keyboards()
 
     bot = Bot(
         token=settings.BOT_TOKEN,
@@ -60,8 +51,20 @@ async def main():
     # Default komanda siyahısı (azərbaycan dili)
     await set_bot_commands(bot)
 
+    # RequestLog yazıları fonda, toplu şəkildə
+    log_writer = asyncio.create_task(run_request_log_writer())
+    # last_seen yazıları da fonda, dəqiqədə bir dəfə
+    last_seen_writer = asyncio.create_task(run_last_seen_writer())
+
     logging.info("🤖 Bot işə salınır...")
-    await dp.start_polling(bot)
+    try:
+        # Hər update ayrıca task kimi işlənir — yavaş handler digərlərini gözlətmir
+        await dp.start_polling(bot, handle_as_tasks=True)
+    finally:
+        # Yazıçılar dayandırılanda son dəfə flush edir — bitməsini gözlə
+        log_writer.cancel()
+        last_seen_writer.cancel()
+        await asyncio.gather(log_writer, last_seen_writer, return_exceptions=True)
 
 
 if __name__ == "__main__":
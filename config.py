@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from dotenv import load_dotenv
+import logging
 import os
 from pathlib import Path
 
@@ -14,7 +15,10 @@ class Settings(BaseModel):
     )
 
     # 💾 Verilənlər bazası
-    DATABASE_URL: str = Field(default=os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/bot.db"))
+    DATABASE_URL: str = Field(
+        default=os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/bot.db"),
+        validate_default=True,
+    )
 
     # 📂 Fayl yükləmə yolları
     DOWNLOAD_DIR: str = Field(default=os.getenv("DOWNLOAD_DIR", "./data/downloads"))
@@ -32,6 +36,19 @@ class Settings(BaseModel):
     # 🚀 Performans parametrləri
     MAX_CONCURRENT_DOWNLOADS: int = Field(default=int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "3")))
     CACHE_EXPIRATION_MINUTES: int = Field(default=int(os.getenv("CACHE_EXPIRATION_MINUTES", "30")))
+    DB_POOL_SIZE: int = Field(default=int(os.getenv("DB_POOL_SIZE", "20")))
+    DB_MAX_OVERFLOW: int = Field(default=int(os.getenv("DB_MAX_OVERFLOW", "10")))
+
+
+    @field_validator("DATABASE_URL")
+    @classmethod
+    def _async_pg_driver(cls, url: str) -> str:
+        # Hostinq panellərinin verdiyi postgres:// URL-ləri sync psycopg2 drayverini seçir —
+        # async engine üçün asyncpg-yə yönləndiririk
+        for prefix in ("postgres://", "postgresql://"):
+            if url.startswith(prefix):
+                return "postgresql+asyncpg://" + url[len(prefix):]
+        return url
 
 
 settings = Settings()
@@ -42,6 +59,6 @@ Path("./data").mkdir(parents=True, exist_ok=True)
 Path("./logs").mkdir(parents=True, exist_ok=True)
 
 # 🧩 Debug məqsədilə konsolda qısa status
-print(
+logging.getLogger(__name__).info(
     f"Lyrica Config Loaded | TEST_MODE={settings.TEST_MODE} | LOG={settings.LOG_PATH} | Monitor={'On' if settings.ENABLE_MONITOR else 'Off'}"
 )
@@ -1,14 +1,64 @@
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import BigInteger, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
-SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+# Every handler opens a session, so size the pool for bursty update traffic.
+# PostgreSQL only: SQLite has a single writer, and more connections just mean
+# more "database is locked" errors - it keeps SQLAlchemy's default pool.
+if make_url(settings.DATABASE_URL).get_backend_name() == "postgresql":
+    _pool_kwargs = dict(
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=30,
+        pool_recycle=1800,
+        pool_pre_ping=True,
+    )
+else:
+    _pool_kwargs = {}
+
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=False,
+    future=True,
+    **_pool_kwargs,
+    # Handlers reuse a small set of statements - keep their compiled form around
+    query_cache_size=1200,
+)
+# Handlers commit right after each add, so autoflush only costs extra flush checks
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False, class_=AsyncSession)
+
+# INSERT with .on_conflict_do_update() for the configured backend (PostgreSQL or SQLite)
+dialect_insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
 
 class Base(DeclarativeBase):
     pass
 
 async def init_db():
-    from models import User, Song, Favorite, Playlist, PlaylistItem, RequestLog  # noqa
+    from models import User, Song, Favorite, Playlist, PlaylistItem, RequestLog, QueryCache, SocialVideo  # noqa
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_ensure_indexes)
+        await conn.run_sync(_widen_user_tg_id)
+
+
+def _ensure_indexes(sync_conn) -> None:
+    # create_all skips indexes of tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+def _widen_user_tg_id(sync_conn) -> None:
+    # create_all never alters existing columns: a users table created before
+    # tg_id became BigInteger is still int4 on PostgreSQL (SQLite's INTEGER is 64-bit)
+    if sync_conn.dialect.name != "postgresql":
+        return
+    columns = {c["name"]: c["type"] for c in inspect(sync_conn).get_columns("users")}
+    if not isinstance(columns.get("tg_id"), BigInteger):
+        sync_conn.execute(text("ALTER TABLE users ALTER COLUMN tg_id TYPE BIGINT"))
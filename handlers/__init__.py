@@ -1,5 +1,5 @@
 from aiogram import Dispatcher
-from . import start, search, favorites, playlists, admin, voice, commands, links, recognition, notes
+from . import start, search, favorites, playlists, admin, commands, links, recognition, notes
 
 
 def setup_routers(dp: Dispatcher):
@@ -12,7 +12,6 @@ def setup_routers(dp: Dispatcher):
         favorites.router,
         playlists.router,
         admin.router,
-        voice.router,
         commands.router,
     ):
         dp.include_router(r)
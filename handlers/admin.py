@@ -111,6 +111,25 @@ async def cmd_perf(m: Message):
         await m.answer(f"Xəta: {e}")
 
 
+# 🌐 /reloadlocales – locales/*.json dəyişəndə yaddaşı təmizlə
+@router.message(Command("reloadlocales"))
+async def cmd_reload_locales(m: Message):
+    if not _is_admin(m.from_user.id):
+        return await m.answer("⛔ Yalnız adminlər üçün.")
+
+    from i18n import reload_locales
+    from keyboards import reset_keyboards
+    from handlers.start import start_text
+
+    reload_locales()
+    # Cached keyboards and texts carry strings from the old locale dicts
+    reset_keyboards()
+    start_text.cache_clear()
+
+    await m.answer("✅ Dil faylları yenidən yükləndi.")
+    log_event("INFO", f"Locales reloaded ({m.from_user.id})")
+
+
 # 📨 Broadcast (mass message)
 @router.message(Command("broadcast"))
 async def broadcast(m: Message):
@@ -1,149 +1,71 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from sqlalchemy import select
 
 from db import SessionLocal
-from models import User, Song, Favorite
-from keyboards import song_actions
+from models import Song, Favorite
+from keyboards import song_actions_cached, FavOpenCallback
+from services.user_service import get_user_cached, get_user_lang
 from i18n import t
 
 router = Router()
 
 
-# ============================================================
-# ℹ️ /help
-# ============================================================
-@router.message(Command("help"))
-async def cmd_help(m: Message):
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == m.from_user.id))
-        ).scalars().first()
-
-    lang = user.language if user else "az"
-    await m.answer(t(lang, "help_text"))
-
-
-# ============================================================
-# 🌐 /lang
-# ============================================================
-@router.message(Command("lang"))
-async def cmd_lang(m: Message):
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="🇦🇿 AZ", callback_data="setlang:az"),
-            InlineKeyboardButton(text="🇬🇧 EN", callback_data="setlang:en"),
-            InlineKeyboardButton(text="🇷🇺 RU", callback_data="setlang:ru"),
-        ]
-    ])
-    await m.answer("🌍 Dil seç:", reply_markup=kb)
-
-
 # ============================================================
 # ⭐ /favorites
 # ============================================================
 @router.message(Command("favorites"))
 async def show_favorites(m: Message):
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == m.from_user.id))
-        ).scalars().first()
-
-        if not user:
-            await m.answer("⚠️ Zəhmət olmasa əvvəl /start yaz.")
-            return
-
-        lang = user.language
-
-        fav_songs = (
-            await s.execute(
-                select(Song)
-                .join(Favorite)
-                .where(Favorite.user_id == user.id)
-                .order_by(Song.title.asc())
-            )
-        ).scalars().all()
-
-    if not fav_songs:
-        await m.answer(t(lang, "favorites_empty"))
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
+        await m.answer("⚠️ Zəhmət olmasa əvvəl /start yaz.")
         return
 
-    btns = [
-        [InlineKeyboardButton(text=f"🎧 {song.title}", callback_data=f"favopen:{song.youtube_id}")]
-        for song in fav_songs
-    ]
-
-    await m.answer(
-        t(lang, "favorites_list"),
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=btns)
-    )
-
-
-# ============================================================
-# ⭐ Menü → Sevimlilər
-# ============================================================
-@router.callback_query(F.data == "menu:favorites")
-async def menu_fav(c: CallbackQuery):
     async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == c.from_user.id))
-        ).scalars().first()
-
-        lang = user.language
-
         fav_songs = (
             await s.execute(
                 select(Song)
                 .join(Favorite)
-                .where(Favorite.user_id == user.id)
+                .where(Favorite.user_id == user_id)
                 .order_by(Song.title.asc())
             )
         ).scalars().all()
 
     if not fav_songs:
-        await c.message.edit_text(t(lang, "favorites_empty"))
-        await c.answer()
+        await m.answer(t(lang, "favorites_empty"))
         return
 
     btns = [
-        [InlineKeyboardButton(text=f"🎧 {song.title}", callback_data=f"favopen:{song.youtube_id}")]
+        [InlineKeyboardButton(text=f"🎧 {song.title}", callback_data=FavOpenCallback(yt_id=song.youtube_id).pack())]
         for song in fav_songs
     ]
 
-    await c.message.edit_text(
+    await m.answer(
         t(lang, "favorites_list"),
         reply_markup=InlineKeyboardMarkup(inline_keyboard=btns)
     )
-    await c.answer()
 
 
 # ============================================================
 # 🎧 Sevimlilər → Mahnı Detalları
 # ============================================================
-@router.callback_query(F.data.startswith("favopen:"))
-async def open_favorite_song(c: CallbackQuery):
-    yt_id = c.data.split(":")[1]
+@router.callback_query(FavOpenCallback.filter())
+async def open_favorite_song(c: CallbackQuery, callback_data: FavOpenCallback):
+    yt_id = callback_data.yt_id
 
     async with SessionLocal() as s:
-        song = (
-            await s.execute(select(Song).where(Song.youtube_id == yt_id))
-        ).scalars().first()
-
-        user = (
-            await s.execute(select(User).where(User.tg_id == c.from_user.id))
-        ).scalars().first()
+        song = await s.scalar(select(Song).where(Song.youtube_id == yt_id))
 
     if not song:
         await c.answer("⚠️ Mahnı tapılmadı.", show_alert=True)
         return
 
-    lang = user.language or "az"
+    lang = await get_user_lang(c.from_user.id)
 
-    from i18n import _load as _lang
     await c.message.answer(
         f"🎧 {song.title}\n👤 {song.artist}",
-        reply_markup=song_actions(_lang(lang), song.youtube_id)
+        reply_markup=song_actions_cached(lang, song.youtube_id)
     )
 
     await c.answer()
@@ -2,19 +2,20 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, InputFile
 from sqlalchemy import select
 from db import SessionLocal
-from models import User, Favorite, Song
+from models import Favorite, Song
+from services.user_service import get_user_cached
 router = Router()
 
 @router.callback_query(F.data == "menu:favorites")
 async def menu_favorites(c: CallbackQuery):
+    user_id, lang = await get_user_cached(c.from_user.id)
+    if user_id is None:
+        await c.answer("User not found", show_alert=True); return
     async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == c.from_user.id))).scalars().first()
-        if not u:
-            await c.answer("User not found", show_alert=True); return
-        favs = (await s.execute(select(Favorite, Song).join(Song, Favorite.song_id == Song.id).where(Favorite.user_id == u.id))).all()
+        favs = (await s.execute(select(Favorite, Song).join(Song, Favorite.song_id == Song.id).where(Favorite.user_id == user_id))).all()
     if not favs:
         from i18n import t
-        await c.message.answer(t(u.language, "fav_empty")); await c.answer(); return
+        await c.message.answer(t(lang, "fav_empty")); await c.answer(); return
     # send as list
     text = "⭐ Favorites:\n" + "\n".join([f"- {row[1].title}" for row in favs[:25]])
     await c.message.answer(text)
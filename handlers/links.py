@@ -2,10 +2,11 @@ from aiogram import Router, F
 from aiogram.types import Message
 from sqlalchemy import select
 from db import SessionLocal
-from models import User, Song, RequestLog
+from models import Song
 from i18n import t
-from i18n import _load as _lang
-from keyboards import song_actions
+from keyboards import song_actions_cached
+from services.user_service import get_user_lang
+from services.request_log import queue_request_log
 from services.youtube import is_youtube_link, download_from_url, YTResult
 from datetime import datetime, timezone
 import logging
@@ -23,7 +24,8 @@ async def on_link(m: Message):
     logger.info(f"[LINKS] Handler called with text: {text[:100]}")
     
     # Skip TikTok and Instagram links - they are handled by recognition.py
-    if "tiktok.com" in text.lower() or "vm.tiktok.com" in text.lower() or "instagram.com" in text.lower():
+    lowered = text.lower()  # vm.tiktok.com is covered by "tiktok.com"
+    if "tiktok.com" in lowered or "instagram.com" in lowered:
         logger.info(f"[LINKS] Skipping TikTok/Instagram link")
         return
     
@@ -34,12 +36,8 @@ async def on_link(m: Message):
     
     logger.info(f"🔗 YouTube link handler processing: {text[:50]}")
     
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == m.from_user.id))
-        ).scalars().first()
-    
-    lang = user.language if user and getattr(user, "language", None) else "az"
+    # Cached language - no DB session for the lookup
+    lang = await get_user_lang(m.from_user.id)
     
     await m.answer(t(lang, "downloading"))
     
@@ -59,9 +57,7 @@ async def on_link(m: Message):
     
     # Save to database
     async with SessionLocal() as s:
-        song = (
-            await s.execute(select(Song).where(Song.youtube_id == yt.youtube_id))
-        ).scalars().first()
+        song = await s.scalar(select(Song).where(Song.youtube_id == yt.youtube_id))
         
         if not song:
             song = Song(
@@ -74,19 +70,9 @@ async def on_link(m: Message):
             )
             s.add(song)
             await s.commit()
-            await s.refresh(song)
         
-        # Log request
-        if user:
-            s.add(
-                RequestLog(
-                    user_id=user.id,
-                    query=text,
-                    via_voice=False,
-                    matched_song_id=song.id,
-                )
-            )
-            await s.commit()
+        # Log request (written in the background)
+        queue_request_log(m.from_user.id, text, matched_song_id=song.id)
     
     # Send result
     msg = t(
@@ -98,4 +84,4 @@ async def on_link(m: Message):
     )
 
     # ✅ FIXED: Send song.id (DB ID), not YouTube ID
-    await m.answer(msg, reply_markup=song_actions(_lang(lang), str(song.id)))
+    await m.answer(msg, reply_markup=song_actions_cached(lang, song.youtube_id))
@@ -5,10 +5,8 @@ Handles /not command for extracting musical notes and chords
 from aiogram import Router, F
 from aiogram.types import Message, FSInputFile
 from aiogram.filters import Command
-from sqlalchemy import select
-from db import SessionLocal
-from models import User
 from i18n import t
+from services.user_service import get_user_lang
 from services.notes_extraction_service import get_notes_service
 from utils.audio_tools import convert_audio_format, extract_audio_from_video
 import os
@@ -22,12 +20,7 @@ router = Router()
 @router.message(Command("not"))
 async def on_notes_command(m: Message):
     """Handle /not command for music notes extraction"""
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == m.from_user.id))
-        ).scalars().first()
-    
-    lang = user.language if user and getattr(user, "language", None) else "az"
+    lang = await get_user_lang(m.from_user.id)
     
     # Check if replying to a message with audio/video/voice
     if m.reply_to_message:
@@ -39,24 +32,21 @@ async def on_notes_command(m: Message):
             if m.reply_to_message.voice:
                 ogg_path = os.path.join(temp_dir, "voice.ogg")
                 wav_path = os.path.join(temp_dir, "voice.wav")
-                file = await m.bot.get_file(m.reply_to_message.voice.file_id)
-                await m.bot.download_file(file.file_path, destination=ogg_path)
-                audio_source = convert_audio_format(ogg_path, wav_path, "wav", 44100, 1)
+                await m.bot.download(m.reply_to_message.voice, destination=ogg_path)
+                audio_source = await convert_audio_format(ogg_path, wav_path, "wav", 44100, 1)
             
             # Check for audio
             elif m.reply_to_message.audio:
                 audio_path = os.path.join(temp_dir, "audio.wav")
-                file = await m.bot.get_file(m.reply_to_message.audio.file_id)
-                await m.bot.download_file(file.file_path, destination=audio_path)
-                audio_source = convert_audio_format(audio_path, os.path.join(temp_dir, "converted.wav"), "wav", 44100, 1)
+                await m.bot.download(m.reply_to_message.audio, destination=audio_path)
+                audio_source = await convert_audio_format(audio_path, os.path.join(temp_dir, "converted.wav"), "wav", 44100, 1)
             
             # Check for video
             elif m.reply_to_message.video:
                 video_path = os.path.join(temp_dir, "video.mp4")
                 wav_path = os.path.join(temp_dir, "audio.wav")
-                file = await m.bot.get_file(m.reply_to_message.video.file_id)
-                await m.bot.download_file(file.file_path, destination=video_path)
-                audio_source = extract_audio_from_video(video_path, wav_path, duration=30)
+                await m.bot.download(m.reply_to_message.video, destination=video_path)
+                audio_source = await extract_audio_from_video(video_path, wav_path, duration=30)
             
             if not audio_source:
                 await m.answer(t(lang, "notes.no_audio_source"))
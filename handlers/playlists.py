@@ -1,12 +1,13 @@
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select
-from db import SessionLocal
-from models import User, Playlist
+from models import Playlist
 from i18n import t
+from keyboards import SongCallback, PlaylistCallback
 from services import playlists_service
+from services.user_service import get_user_cached
+from utils.common import UPLOAD_CHUNK_SIZE
 
 router = Router()
 
@@ -19,14 +20,13 @@ async def new_playlist(m: Message):
     args = (m.text or "").split(maxsplit=1)
     name = args[1].strip() if len(args) > 1 else "My Playlist"
 
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
         await m.answer("User not found")
         return
 
-    pl = await playlists_service.create_playlist(u.id, name)
-    await m.answer(t(u.language, "pl_created", name=pl.name))
+    pl = await playlists_service.create_playlist(user_id, name)
+    await m.answer(t(lang, "pl_created", name=pl.name))
 
 
 # ============================================================
@@ -34,14 +34,12 @@ async def new_playlist(m: Message):
 # ============================================================
 @router.message(Command("playlists"))
 async def cmd_playlists(m: Message):
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
         await m.answer("User not found")
         return
 
-    lang = u.language
-    pls = await playlists_service.list_playlists(u.id)
+    pls = await playlists_service.list_playlists(user_id)
     if not pls:
         await m.answer(t(lang, "pl_empty"))
         return
@@ -52,14 +50,12 @@ async def cmd_playlists(m: Message):
 
 @router.callback_query(F.data == "menu:playlists")
 async def show_playlists(c: CallbackQuery):
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == c.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(c.from_user.id)
+    if user_id is None:
         await c.answer("User not found", show_alert=True)
         return
 
-    lang = u.language
-    pls = await playlists_service.list_playlists(u.id)
+    pls = await playlists_service.list_playlists(user_id)
     if not pls:
         await c.message.answer(t(lang, "pl_empty"))
         await c.answer()
@@ -75,9 +71,8 @@ async def show_playlists(c: CallbackQuery):
 # ============================================================
 @router.message(Command("delplaylist"))
 async def delete_playlist_cmd(m: Message):
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
         await m.answer("User not found")
         return
 
@@ -88,12 +83,12 @@ async def delete_playlist_cmd(m: Message):
 
     pl_id = int(parts[1])
     try:
-        await playlists_service.delete_playlist(pl_id, u.id)
+        await playlists_service.delete_playlist(pl_id, user_id)
     except playlists_service.PlaylistNotFound:
-        await m.answer(t(u.language, "pl_not_found"))
+        await m.answer(t(lang, "pl_not_found"))
         return
 
-    await m.answer(t(u.language, "pl_deleted", id=pl_id))
+    await m.answer(t(lang, "pl_deleted", id=pl_id))
 
 
 # ============================================================
@@ -101,9 +96,8 @@ async def delete_playlist_cmd(m: Message):
 # ============================================================
 @router.message(Command("renameplaylist"))
 async def rename_playlist_cmd(m: Message):
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
         await m.answer("User not found")
         return
 
@@ -115,12 +109,12 @@ async def rename_playlist_cmd(m: Message):
     pl_id = int(parts[1])
     new_name = parts[2].strip()
     try:
-        await playlists_service.rename_playlist(pl_id, u.id, new_name)
+        await playlists_service.rename_playlist(pl_id, user_id, new_name)
     except playlists_service.PlaylistNotFound:
-        await m.answer(t(u.language, "pl_not_found"))
+        await m.answer(t(lang, "pl_not_found"))
         return
 
-    await m.answer(t(u.language, "pl_renamed", id=pl_id, name=new_name))
+    await m.answer(t(lang, "pl_renamed", id=pl_id, name=new_name))
 
 
 # ============================================================
@@ -128,9 +122,8 @@ async def rename_playlist_cmd(m: Message):
 # ============================================================
 @router.message(Command("playlist_add"))
 async def playlist_add_cmd(m: Message):
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
         await m.answer("User not found")
         return
 
@@ -143,15 +136,15 @@ async def playlist_add_cmd(m: Message):
     yt_id = parts[2].strip()
 
     try:
-        item = await playlists_service.add_item(pl_id, u.id, yt_id)
+        item = await playlists_service.add_item(pl_id, user_id, yt_id)
     except playlists_service.PlaylistNotFound:
-        await m.answer(t(u.language, "pl_not_found"))
+        await m.answer(t(lang, "pl_not_found"))
         return
     except ValueError:
-        await m.answer(t(u.language, "song_not_found"))
+        await m.answer(t(lang, "song_not_found"))
         return
 
-    await m.answer(t(u.language, "pl_item_added", id=pl_id))
+    await m.answer(t(lang, "pl_item_added", id=pl_id))
 
 
 # ============================================================
@@ -159,9 +152,8 @@ async def playlist_add_cmd(m: Message):
 # ============================================================
 @router.message(Command("playlist_remove"))
 async def playlist_remove_cmd(m: Message):
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
         await m.answer("User not found")
         return
 
@@ -174,12 +166,12 @@ async def playlist_remove_cmd(m: Message):
     item_id = int(parts[2])
 
     try:
-        await playlists_service.remove_item(pl_id, u.id, item_id)
+        await playlists_service.remove_item(pl_id, user_id, item_id)
     except playlists_service.PlaylistNotFound:
-        await m.answer(t(u.language, "pl_not_found"))
+        await m.answer(t(lang, "pl_not_found"))
         return
 
-    await m.answer(t(u.language, "pl_item_removed", id=pl_id))
+    await m.answer(t(lang, "pl_item_removed", id=pl_id))
 
 
 # ============================================================
@@ -187,9 +179,8 @@ async def playlist_remove_cmd(m: Message):
 # ============================================================
 @router.message(Command("playlist_reorder"))
 async def playlist_reorder_cmd(m: Message):
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
         await m.answer("User not found")
         return
 
@@ -203,12 +194,12 @@ async def playlist_reorder_cmd(m: Message):
     new_pos = int(parts[3])
 
     try:
-        await playlists_service.reorder_items(pl_id, u.id, {item_id: new_pos})
+        await playlists_service.reorder_items(pl_id, user_id, {item_id: new_pos})
     except playlists_service.PlaylistNotFound:
-        await m.answer(t(u.language, "pl_not_found"))
+        await m.answer(t(lang, "pl_not_found"))
         return
 
-    await m.answer(t(u.language, "pl_reordered", id=pl_id))
+    await m.answer(t(lang, "pl_reordered", id=pl_id))
 
 
 # ============================================================
@@ -216,9 +207,8 @@ async def playlist_reorder_cmd(m: Message):
 # ============================================================
 @router.message(Command("playlist_play"))
 async def playlist_play_cmd(m: Message):
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(m.from_user.id)
+    if user_id is None:
         await m.answer("User not found")
         return
 
@@ -230,24 +220,27 @@ async def playlist_play_cmd(m: Message):
     pl_id = int(parts[1])
 
     try:
-        queue = await playlists_service.get_play_queue(pl_id, u.id)
+        queue = await playlists_service.get_play_queue(pl_id, user_id)
     except playlists_service.PlaylistNotFound:
-        await m.answer(t(u.language, "pl_not_found"))
+        await m.answer(t(lang, "pl_not_found"))
         return
 
     if not queue:
-        await m.answer(t(u.language, "pl_empty"))
+        await m.answer(t(lang, "pl_empty"))
         return
 
-    await m.answer(t(u.language, "pl_playing", id=pl_id))
+    await m.answer(t(lang, "pl_playing", id=pl_id))
 
     # Sadə ardıcıl göndərmə (hazırda delay yoxdur, Telegram özü sıraya qoyur)
-    from aiogram.types import FSInputFile
     for item in queue:
         if not item["file_path"]:
             continue
         try:
-            file = FSInputFile(item["file_path"], filename=f"{item['title']}.mp3")
+            file = FSInputFile(
+                item["file_path"],
+                filename=f"{item['title']}.mp3",
+                chunk_size=UPLOAD_CHUNK_SIZE,
+            )
             await m.answer_document(file)
         except Exception:
             continue
@@ -256,27 +249,20 @@ async def playlist_play_cmd(m: Message):
 # ============================================================
 # 🎵 Inline: song_actions → "➕ Playlist" düyməsi
 # ============================================================
-@router.callback_query(F.data.startswith("song:pl:"))
-async def cb_choose_playlist_for_song(c: CallbackQuery):
+@router.callback_query(SongCallback.filter(F.action == "pl"))
+async def cb_choose_playlist_for_song(c: CallbackQuery, callback_data: SongCallback):
     """Mahnını playlist-ə əlavə etmək üçün playlist seçimi.
 
     callback_data: song:pl:<yt_id>
     """
-    parts = c.data.split(":", 2)
-    if len(parts) != 3:
-        await c.answer("Invalid data", show_alert=True)
-        return
-
-    yt_id = parts[2]
+    yt_id = callback_data.yt_id
 
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == c.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(c.from_user.id)
+    if user_id is None:
         await c.answer("User not found", show_alert=True)
         return
 
-    lang = u.language
-    pls = await playlists_service.list_playlists(u.id)
+    pls = await playlists_service.list_playlists(user_id)
 
     if not pls:
         # Heç bir playlist yoxdur
@@ -285,7 +271,7 @@ async def cb_choose_playlist_for_song(c: CallbackQuery):
                 [
                     InlineKeyboardButton(
                         text=t(lang, "playlist.create_new"),
-                        callback_data=f"pl:new:{yt_id}",
+                        callback_data=PlaylistCallback(action="new", yt_id=yt_id).pack(),
                     )
                 ]
             ]
@@ -299,7 +285,7 @@ async def cb_choose_playlist_for_song(c: CallbackQuery):
         builder.row(
             InlineKeyboardButton(
                 text=p.name,
-                callback_data=f"pl:add:{p.id}:{yt_id}",
+                callback_data=PlaylistCallback(action="add", playlist_id=p.id, yt_id=yt_id).pack(),
             )
         )
 
@@ -307,7 +293,7 @@ async def cb_choose_playlist_for_song(c: CallbackQuery):
     builder.row(
         InlineKeyboardButton(
             text=t(lang, "playlist.create_new"),
-            callback_data=f"pl:new:{yt_id}",
+            callback_data=PlaylistCallback(action="new", yt_id=yt_id).pack(),
         )
     )
 
@@ -318,30 +304,25 @@ async def cb_choose_playlist_for_song(c: CallbackQuery):
     await c.answer()
 
 
-@router.callback_query(F.data.startswith("pl:add:"))
-async def cb_add_to_playlist(c: CallbackQuery):
+@router.callback_query(PlaylistCallback.filter(F.action == "add"))
+async def cb_add_to_playlist(c: CallbackQuery, callback_data: PlaylistCallback):
     """Seçilmiş playlist-ə mahnı əlavə et.
 
     callback_data: pl:add:<playlist_id>:<yt_id>
     """
-    parts = c.data.split(":", 3)
-    if len(parts) != 4 or not parts[2].isdigit():
+    pl_id, yt_id = callback_data.playlist_id, callback_data.yt_id
+    if pl_id is None:
         await c.answer("Invalid data", show_alert=True)
         return
 
-    _pl, _add, pl_id_str, yt_id = parts
-    pl_id = int(pl_id_str)
-
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == c.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(c.from_user.id)
+    if user_id is None:
         await c.answer("User not found", show_alert=True)
         return
 
-    lang = u.language
 
     try:
-        await playlists_service.add_item(pl_id, u.id, yt_id)
+        await playlists_service.add_item(pl_id, user_id, yt_id)
     except playlists_service.PlaylistNotFound:
         await c.message.answer(t(lang, "pl_not_found"))
         await c.answer()
@@ -355,19 +336,17 @@ async def cb_add_to_playlist(c: CallbackQuery):
     await c.answer()
 
 
-@router.callback_query(F.data.startswith("pl:new:"))
+@router.callback_query(PlaylistCallback.filter(F.action == "new"))
 async def cb_playlist_new_hint(c: CallbackQuery):
     """Yeni playlist yaratmaq üçün sadə köməkçi.
 
     Hazırda inline FSM istifadə etmirik, istifadəçiyə /newplaylist
     əmrindən istifadə etməyi tövsiyə edirik.
     """
-    async with SessionLocal() as s:
-        u = (await s.execute(select(User).where(User.tg_id == c.from_user.id))).scalars().first()
-    if not u:
+    user_id, lang = await get_user_cached(c.from_user.id)
+    if user_id is None:
         await c.answer("User not found", show_alert=True)
         return
 
-    lang = u.language
     await c.message.answer(t(lang, "playlist.use_newplaylist_cmd"))
     await c.answer()
@@ -5,24 +5,43 @@ Handles TikTok, Instagram, YouTube links, videos, and voice messages
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.filters import Command
-from sqlalchemy import select
-from db import SessionLocal
-from models import User, Song, RequestLog
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import SessionLocal, dialect_insert
+from models import Song, SocialVideo
 from i18n import t
-from i18n import _load as _lang
-from keyboards import song_actions
+from keyboards import song_actions_cached
+from services.user_service import get_user_lang
+from services.request_log import queue_request_log
 from services.music_recognition_service import get_recognition_service, RecognitionResult
-from services.youtube import is_youtube_link, download_from_url, YTResult
-from utils.audio_tools import extract_audio_from_video, convert_audio_format
+from services.transcription_service import transcribe_voice
+from services.youtube import is_youtube_link, download_from_url, YTResult, _get_ydl_opts
+from utils.audio_tools import extract_audio_from_video, extract_audio_bytes
+from utils.common import path_exists
 from typing import Optional
+import asyncio
+import html
 import os
+import re
+import shutil
 import tempfile
+import threading
 import logging
 import yt_dlp
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Seconds of audio sent to the recognizer - a match needs ~10-15 s, and a
+# shorter clip means less ffmpeg work and a smaller upload
+RECOGNITION_SNIPPET_SECONDS = 20
+
+# Precompiled so aiogram can reject non-link text at dispatch time
+_SOCIAL_RE = re.compile(
+    r"tiktok\.com|instagram\.com/(?:reel|p/)|youtube\.com/(?:watch|shorts/)|youtu\.be/",
+    re.IGNORECASE,
+)
+
 
 def is_tiktok_link(url: str) -> bool:
     """Check if URL is a TikTok link"""
@@ -57,16 +76,68 @@ def is_social_media_link(text: str) -> bool:
     """Check if text is a TikTok, Instagram, or YouTube link"""
     if not text or not isinstance(text, str):
         return False
-    text = text.strip().lower()
-    return (
-        "tiktok.com" in text or
-        "vm.tiktok.com" in text or
-        "vt.tiktok.com" in text or
-        ("instagram.com" in text and ("/reel" in text or "/p/" in text)) or
-        "youtube.com/watch" in text or
-        "youtu.be/" in text or
-        "youtube.com/shorts/" in text
-    )
+    return _SOCIAL_RE.search(text) is not None
+
+
+# yt-dlp options for recognition downloads, built once: optimized settings from
+# services.youtube, but video format (not audio-only), no audio postprocessor and
+# more aggressive retries. Only "outtmpl" varies per request.
+_VIDEO_YDL_OPTS_BASE = {
+    **_get_ydl_opts("", download=False),
+    "format": "best[height<=720]/best",
+    "extract_flat": False,
+    "skip_download": False,
+    "retries": 5,
+    "fragment_retries": 5,
+    "skip_unavailable_fragments": True,
+}
+
+# YoutubeDL construction (extractors, cookiejar, HTTP opener) is costly, so each
+# executor thread keeps one instance per platform. Thread-local instances need
+# no lock even though outtmpl is switched per request.
+_ydl_local = threading.local()
+
+
+def _get_video_ydl(platform: str, template: str) -> yt_dlp.YoutubeDL:
+    """Return this thread's cached YoutubeDL for the platform, writing to template"""
+    instances = getattr(_ydl_local, "instances", None)
+    if instances is None:
+        instances = _ydl_local.instances = {}
+    ydl = instances.get(platform)
+    if ydl is None:
+        ydl = instances[platform] = yt_dlp.YoutubeDL({**_VIDEO_YDL_OPTS_BASE, "outtmpl": template})
+    ydl.params["outtmpl"]["default"] = template
+    return ydl
+
+
+def _remove_temp_dir(temp_dir: str) -> None:
+    """Remove a recognition temp dir with its files; only filesystem errors are ignored"""
+    try:
+        shutil.rmtree(temp_dir)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.debug(f"Failed to clean up temp dir {temp_dir}: {e}")
+
+
+def _remove_file(path: str) -> None:
+    """Delete a downloaded file, ignoring one that is already gone"""
+    try:
+        os.unlink(path)
+        logger.debug(f"🗑️ Cleaned up video file: {path}")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.debug(f"Failed to clean up video file {path}: {e}")
+
+
+def _discard_task(task: asyncio.Task) -> None:
+    """Cancel a helper task the handler no longer awaits, or consume its finished result"""
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        # Already finished - retrieve the error so it isn't reported as unhandled
+        task.exception()
 
 
 async def download_video_audio(url: str, platform: str) -> tuple[Optional[str], Optional[dict]]:
@@ -86,22 +157,7 @@ async def download_video_audio(url: str, platform: str) -> tuple[Optional[str],
     audio_path = os.path.join(temp_dir, f"audio_{platform}.wav")
     
     try:
-        # Use optimized yt-dlp settings
-        from services.youtube import _get_ydl_opts
-        import asyncio
-        
         template = os.path.join(temp_dir, "%(id)s.%(ext)s")
-        ydl_opts = _get_ydl_opts(template, download=True)
-        
-        # Override format for video download (not audio-only)
-        ydl_opts["format"] = "best[height<=720]/best"
-        # Remove audio postprocessor - we want video
-        ydl_opts.pop("postprocessors", None)
-        
-        # Add more aggressive retry settings
-        ydl_opts["retries"] = 5
-        ydl_opts["fragment_retries"] = 5
-        ydl_opts["skip_unavailable_fragments"] = True
         
         # Run in executor to avoid blocking
         loop = asyncio.get_running_loop()
@@ -115,66 +171,66 @@ async def download_video_audio(url: str, platform: str) -> tuple[Optional[str],
                     download_url = clean_youtube_url(url)
                     logger.info(f"📥 Cleaned YouTube URL: {download_url}")
                 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    logger.info(f"📥 Downloading {platform} video from: {download_url}")
-                    info = ydl.extract_info(download_url, download=True)
-                    
-                    # Check if info is None
+                ydl = _get_video_ydl(platform, template)
+                logger.info(f"📥 Downloading {platform} video from: {download_url}")
+                info = ydl.extract_info(download_url, download=True)
+                
+                # Check if info is None
+                if info is None:
+                    logger.error(f"yt-dlp returned None for {platform} URL: {url}")
+                    return None, None
+                
+                # Check if it's a playlist/entries
+                if isinstance(info, dict) and "entries" in info:
+                    if not info["entries"]:
+                        logger.error(f"No entries in {platform} result")
+                        return None, None
+                    info = info["entries"][0]
+                    # Check again if entry is None
                     if info is None:
-                        logger.error(f"yt-dlp returned None for {platform} URL: {url}")
+                        logger.error(f"First entry is None in {platform} result")
                         return None, None
+                
+                # Extract video info
+                video_info = {
+                    "duration": int(info.get("duration") or 0),
+                    "title": info.get("title") or "Unknown",
+                    "uploader": info.get("uploader") or info.get("channel") or "Unknown",
+                    "thumbnail": info.get("thumbnail") or (info.get("thumbnails", [{}])[-1].get("url") if info.get("thumbnails") else ""),
+                    "id": info.get("id") or "",
+                }
+                
+                video_file = ydl.prepare_filename(info)
+                logger.info(f"📁 Expected video file: {video_file}")
+                
+                if not os.path.exists(video_file):
+                    # Try to find downloaded file
+                    logger.warning(f"Expected file not found, searching in {temp_dir}")
+                    for ext in ["mp4", "webm", "mkv", "m4a", "mp3"]:
+                        # Try with video ID
+                        alt_file = os.path.join(temp_dir, f"{info.get('id')}.{ext}")
+                        if os.path.exists(alt_file):
+                            video_file = alt_file
+                            logger.info(f"✅ Found alternative file: {video_file}")
+                            break
                     
-                    # Check if it's a playlist/entries
-                    if isinstance(info, dict) and "entries" in info:
-                        if not info["entries"]:
-                            logger.error(f"No entries in {platform} result")
-                            return None, None
-                        info = info["entries"][0]
-                        # Check again if entry is None
-                        if info is None:
-                            logger.error(f"First entry is None in {platform} result")
-                            return None, None
-                    
-                    # Extract video info
-                    video_info = {
-                        "duration": int(info.get("duration") or 0),
-                        "title": info.get("title") or "Unknown",
-                        "uploader": info.get("uploader") or info.get("channel") or "Unknown",
-                        "thumbnail": info.get("thumbnail") or (info.get("thumbnails", [{}])[-1].get("url") if info.get("thumbnails") else ""),
-                        "id": info.get("id") or "",
-                    }
-                    
-                    video_file = ydl.prepare_filename(info)
-                    logger.info(f"📁 Expected video file: {video_file}")
-                    
-                    if not os.path.exists(video_file):
-                        # Try to find downloaded file
-                        logger.warning(f"Expected file not found, searching in {temp_dir}")
-                        for ext in ["mp4", "webm", "mkv", "m4a", "mp3"]:
-                            # Try with video ID
-                            alt_file = os.path.join(temp_dir, f"{info.get('id')}.{ext}")
-                            if os.path.exists(alt_file):
-                                video_file = alt_file
-                                logger.info(f"✅ Found alternative file: {video_file}")
-                                break
-                        
-                        # If still not found, search all files in temp_dir
-                        if not os.path.exists(video_file):
-                            files = os.listdir(temp_dir)
-                            logger.info(f"Files in temp_dir: {files}")
-                            if files:
-                                # Get the newest file
-                                video_file = os.path.join(temp_dir, max(files, key=lambda f: os.path.getctime(os.path.join(temp_dir, f))))
-                                logger.info(f"✅ Using newest file: {video_file}")
-                    
-                    # Final check if file exists
+                    # If still not found, search all files in temp_dir
                     if not os.path.exists(video_file):
-                        logger.error(f"❌ Downloaded file not found: {video_file}")
-                        # Still return video_info even if file not found
-                        return None, video_info
-                    
-                    logger.info(f"✅ Video downloaded successfully: {video_file}")
-                    return video_file, video_info
+                        files = os.listdir(temp_dir)
+                        logger.info(f"Files in temp_dir: {files}")
+                        if files:
+                            # Get the newest file
+                            video_file = os.path.join(temp_dir, max(files, key=lambda f: os.path.getctime(os.path.join(temp_dir, f))))
+                            logger.info(f"✅ Using newest file: {video_file}")
+                
+                # Final check if file exists
+                if not os.path.exists(video_file):
+                    logger.error(f"❌ Downloaded file not found: {video_file}")
+                    # Still return video_info even if file not found
+                    return None, video_info
+                
+                logger.info(f"✅ Video downloaded successfully: {video_file}")
+                return video_file, video_info
             except Exception as e:
                 logger.error(f"Error in _blocking_download for {platform}: {e}", exc_info=True)
                 return None, None
@@ -189,12 +245,12 @@ async def download_video_audio(url: str, platform: str) -> tuple[Optional[str],
             logger.error(f"Video file does not exist: {video_file}")
             return None, video_info
         
-        # Extract audio (first 30 seconds for recognition)
+        # Extract a short clip for recognition
         logger.info(f"🎵 Extracting audio from: {video_file}")
-        extracted = extract_audio_from_video(
+        extracted = await extract_audio_from_video(
             video_file,
             output_path=audio_path,
-            duration=30,
+            duration=RECOGNITION_SNIPPET_SECONDS,
             start_time=0
         )
         
@@ -210,22 +266,82 @@ async def download_video_audio(url: str, platform: str) -> tuple[Optional[str],
         return None, None
     finally:
         # Cleanup video file but keep audio
-        if video_file and os.path.exists(video_file):
-            try:
-                os.unlink(video_file)
-                logger.debug(f"🗑️ Cleaned up video file: {video_file}")
-            except:
-                pass
+        if video_file:
+            await asyncio.to_thread(_remove_file, video_file)
+
+
+# Stable per-video keys in social media URLs (full TikTok links, short links, reels/posts)
+_SOCIAL_VIDEO_ID_RE = {
+    "tiktok": re.compile(r"/video/(\d+)|(?:vm|vt)\.tiktok\.com/(\w+)", re.IGNORECASE),
+    "instagram": re.compile(r"instagram\.com/(?:reel|p|tv)/([\w-]+)", re.IGNORECASE),
+}
+
+
+def _social_video_id(url: str, platform: str) -> Optional[str]:
+    """Extract the platform video ID from a social media URL"""
+    pattern = _SOCIAL_VIDEO_ID_RE.get(platform)
+    match = pattern.search(url) if pattern else None
+    if not match:
+        return None
+    return next((g for g in match.groups() if g), None)
+
+
+async def _find_known_social_song(platform: str, video_id: str) -> Optional[Song]:
+    """Find a downloaded song previously matched to this social media video"""
+    async with SessionLocal() as s:
+        song = await s.scalar(
+            select(Song)
+            .join(SocialVideo, SocialVideo.song_id == Song.id)
+            .where(
+                SocialVideo.platform == platform,
+                SocialVideo.video_id == video_id,
+                Song.file_path != "",
+            )
+        )
+    
+    if song and await path_exists(song.file_path):
+        return song
+    return None
+
+
+async def _remember_social_song(s: AsyncSession, platform: str, video_id: str, song_id: int) -> None:
+    """Store (or refresh) the social video -> song mapping"""
+    stmt = dialect_insert(SocialVideo).values(platform=platform, video_id=video_id, song_id=song_id)
+    await s.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[SocialVideo.platform, SocialVideo.video_id],
+            set_={"song_id": stmt.excluded.song_id, "created_at": func.now()},
+        )
+    )
+    await s.commit()
 
 
 async def _process_social_media(m: Message, text: str, platform: str):
     """Generic handler for social media links (TikTok, Instagram)"""
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == m.from_user.id))
-        ).scalars().first()
+    # Cached language - no DB session for the lookup
+    lang = await get_user_lang(m.from_user.id)
     
-    lang = user.language if user and getattr(user, "language", None) else "az"
+    # Warm start: a video we already matched to a downloaded song skips yt-dlp entirely
+    video_id = _social_video_id(text, platform)
+    known_song = await _find_known_social_song(platform, video_id) if video_id else None
+    if known_song:
+        logger.info(f"♻️ Known {platform} video {video_id} -> song {known_song.id}, skipping download")
+        queue_request_log(m.from_user.id, text, matched_song_id=known_song.id)
+        
+        await m.answer(
+            t(
+                lang,
+                "search_result",
+                title=known_song.title,
+                artist=known_song.artist,
+                duration=known_song.duration,
+            )
+        )
+        await m.answer(
+            t(lang, "recognition.song_info"),
+            reply_markup=song_actions_cached(lang, known_song.youtube_id)
+        )
+        return
     
     # Send processing message
     platform_names = {"tiktok": "TikTok", "instagram": "Instagram"}
@@ -233,6 +349,7 @@ async def _process_social_media(m: Message, text: str, platform: str):
     
     logger.info(f"Processing {platform} link for user {m.from_user.id}")
     
+    speculative_task: Optional[asyncio.Task] = None
     try:
         # Step 1: Download video and extract audio for recognition
         logger.info(f"Step 1: Downloading {platform} video and extracting audio")
@@ -261,9 +378,7 @@ async def _process_social_media(m: Message, text: str, platform: str):
                             final_youtube_id = original_yt.youtube_id
                             
                             async with SessionLocal() as s:
-                                song = (
-                                    await s.execute(select(Song).where(Song.youtube_id == final_youtube_id))
-                                ).scalars().first()
+                                song = await s.scalar(select(Song).where(Song.youtube_id == final_youtube_id))
                                 
                                 if not song:
                                     song = Song(
@@ -276,18 +391,11 @@ async def _process_social_media(m: Message, text: str, platform: str):
                                     )
                                     s.add(song)
                                     await s.commit()
-                                    await s.refresh(song)
                                 
-                                if user and song:
-                                    s.add(
-                                        RequestLog(
-                                            user_id=user.id,
-                                            query=text,
-                                            via_voice=False,
-                                            matched_song_id=song.id,
-                                        )
-                                    )
-                                    await s.commit()
+                                if song:
+                                    queue_request_log(m.from_user.id, text, matched_song_id=song.id)
+                                    if video_id:
+                                        await _remember_social_song(s, platform, video_id, song.id)
                             
                             result_text = t(
                                 lang,
@@ -300,7 +408,7 @@ async def _process_social_media(m: Message, text: str, platform: str):
                             await status_msg.edit_text(result_text)
                             await m.answer(
                                 t(lang, "recognition.song_info"),
-                                reply_markup=song_actions(_lang(lang), str(song.id))
+                                reply_markup=song_actions_cached(lang, song.youtube_id)
 
                             )
                             return
@@ -312,6 +420,17 @@ async def _process_social_media(m: Message, text: str, platform: str):
         
         logger.info(f"Audio extracted: {audio_path}")
         
+        # Speculatively look up the video title on YouTube while recognition runs,
+        # so the fallback path doesn't pay for the search after recognition fails.
+        # Metadata only (flat extract) - nothing is downloaded until we know
+        # which track the user gets.
+        from services.social_download import clean_social_media_title
+        from services.youtube import search_and_download, search_multiple, YTResult
+        raw_title = video_info.get("title", "Unknown") if video_info else "Unknown"
+        cleaned_title = clean_social_media_title(raw_title) if raw_title != "Unknown" else "Unknown"
+        if cleaned_title and cleaned_title != "Unknown":
+            speculative_task = asyncio.create_task(search_multiple(cleaned_title, max_results=1))
+        
         # Step 2: Recognize music using API
         logger.info(f"Step 2: Recognizing music from audio")
         await status_msg.edit_text(t(lang, "recognition.recognizing"))
@@ -320,25 +439,15 @@ async def _process_social_media(m: Message, text: str, platform: str):
         recognition_result = await recognition_service.recognize_from_file(audio_path)
         
         # Cleanup temp audio file
-        try:
-            if os.path.exists(audio_path):
-                os.unlink(audio_path)
-            temp_dir = os.path.dirname(audio_path)
-            if os.path.exists(temp_dir):
-                for f in os.listdir(temp_dir):
-                    try:
-                        os.unlink(os.path.join(temp_dir, f))
-                    except:
-                        pass
-                os.rmdir(temp_dir)
-        except:
-            pass
+        await asyncio.to_thread(_remove_temp_dir, os.path.dirname(audio_path))
         
         # Step 3: If recognition successful, search for original on YouTube
         if recognition_result and recognition_result.title and recognition_result.artist and recognition_result.title != "Unknown":
             logger.info(f"✅ Recognition successful: {recognition_result.title} - {recognition_result.artist}")
+            # Recognition gave a better query than the video title
+            if speculative_task:
+                _discard_task(speculative_task)
             await status_msg.edit_text(t(lang, "recognition.searching_original"))
-            from services.youtube import search_and_download, YTResult
             search_query = f"{recognition_result.artist} {recognition_result.title}"
             logger.info(f"Searching YouTube for: {search_query}")
             
@@ -371,22 +480,36 @@ async def _process_social_media(m: Message, text: str, platform: str):
                 final_youtube_id = recognition_result.youtube_id or f"rec_{platform}_{m.from_user.id}_{m.message_id}"
         else:
             logger.warning(f"Recognition failed or returned Unknown, using video info")
-            from services.social_download import clean_social_media_title
-            raw_title = video_info.get("title", "Unknown") if video_info else "Unknown"
-            cleaned_title = clean_social_media_title(raw_title) if raw_title != "Unknown" else "Unknown"
+            speculative_yt: Optional[YTResult] = None
+            if speculative_task:
+                try:
+                    hits = await speculative_task
+                    if hits:
+                        speculative_yt = await download_from_url(
+                            f"https://www.youtube.com/watch?v={hits[0].video_id}"
+                        )
+                except Exception as search_error:
+                    logger.error(f"Speculative YouTube search failed: {search_error}")
             
-            final_title = cleaned_title if cleaned_title else "Unknown"
-            final_artist = video_info.get("uploader", "Unknown") if video_info else "Unknown"
-            final_duration = video_info.get("duration", 0) if video_info else 0
-            final_file_path = ""
-            final_thumbnail = video_info.get("thumbnail", "") if video_info else ""
-            final_youtube_id = f"{platform}_{video_info.get('id', f'{m.from_user.id}_{m.message_id}')}" if video_info else f"{platform}_{m.from_user.id}_{m.message_id}"
+            if speculative_yt and speculative_yt.file_path and os.path.exists(speculative_yt.file_path):
+                logger.info(f"✅ Using speculative YouTube result: {speculative_yt.title} - {speculative_yt.artist}")
+                final_title = speculative_yt.title
+                final_artist = speculative_yt.artist
+                final_duration = speculative_yt.duration
+                final_file_path = speculative_yt.file_path
+                final_thumbnail = speculative_yt.thumbnail
+                final_youtube_id = speculative_yt.youtube_id
+            else:
+                final_title = cleaned_title if cleaned_title else "Unknown"
+                final_artist = video_info.get("uploader", "Unknown") if video_info else "Unknown"
+                final_duration = video_info.get("duration", 0) if video_info else 0
+                final_file_path = ""
+                final_thumbnail = video_info.get("thumbnail", "") if video_info else ""
+                final_youtube_id = f"{platform}_{video_info.get('id', f'{m.from_user.id}_{m.message_id}')}" if video_info else f"{platform}_{m.from_user.id}_{m.message_id}"
         
         # Save to database
         async with SessionLocal() as s:
-            song = (
-                await s.execute(select(Song).where(Song.youtube_id == final_youtube_id))
-            ).scalars().first()
+            song = await s.scalar(select(Song).where(Song.youtube_id == final_youtube_id))
             
             if not song:
                 song = Song(
@@ -399,22 +522,15 @@ async def _process_social_media(m: Message, text: str, platform: str):
                 )
                 s.add(song)
                 await s.commit()
-                await s.refresh(song)
             else:
                 if not song.file_path and final_file_path:
                     song.file_path = final_file_path
                     await s.commit()
             
-            if user and song:
-                s.add(
-                    RequestLog(
-                        user_id=user.id,
-                        query=text,
-                        via_voice=False,
-                        matched_song_id=song.id,
-                    )
-                )
-                await s.commit()
+            if song:
+                queue_request_log(m.from_user.id, text, matched_song_id=song.id)
+                if video_id:
+                    await _remember_social_song(s, platform, video_id, song.id)
         
         if recognition_result and recognition_result.confidence > 0:
             result_key = f"recognition.{platform}_found"
@@ -439,12 +555,16 @@ async def _process_social_media(m: Message, text: str, platform: str):
         if song:
             await m.answer(
                 t(lang, "recognition.song_info"),
-                reply_markup=song_actions(_lang(lang), str(song.id))
+                reply_markup=song_actions_cached(lang, song.youtube_id)
             )
     
     except Exception as e:
         logger.error(f"Social media download error: {e}", exc_info=True)
         await status_msg.edit_text(t(lang, "recognition.error"))
+    finally:
+        # Not needed (recognition won) or abandoned by an error
+        if speculative_task:
+            _discard_task(speculative_task)
 
 
 async def process_tiktok(m: Message, text: str):
@@ -457,17 +577,13 @@ async def process_instagram(m: Message, text: str):
     await _process_social_media(m, text, "instagram")
 
 
-@router.message(F.text & ~F.via_bot & ~F.text.startswith("/"))
+@router.message(F.text.regexp(_SOCIAL_RE) & ~F.via_bot & ~F.text.startswith("/"))
 async def on_social_media_link(m: Message):
     """Handle TikTok, Instagram, and YouTube links ONLY"""
+    # Non-link text never reaches here: the regexp filter rejects it at
+    # dispatch time, so the handler chain continues to links/search.
     text = m.text.strip()
     
-    # CRITICAL: Check if it's a social media link first
-    if not is_social_media_link(text):
-        # Not a social media link - let other handlers process it
-        # DO NOT return here - let the handler chain continue
-        return
-    
     logger.info(f"[RECOGNITION] Processing social media link: {text[:100]}")
     
     # Route based on platform
@@ -482,14 +598,39 @@ async def on_social_media_link(m: Message):
     return True
 
 
+async def _save_recognized_song(
+    result: RecognitionResult, fallback_id: str, thumbnail: str = ""
+) -> Optional[str]:
+    """Make sure a Song row exists for a recognition result; return its youtube_id"""
+    final_youtube_id = result.youtube_id or fallback_id
+    async with SessionLocal() as s:
+        if not result.title:
+            # Nothing to insert - only an existing row can be offered
+            return await s.scalar(select(Song.youtube_id).where(Song.youtube_id == final_youtube_id))
+        
+        # One round-trip; a concurrent identical recognition can't hit IntegrityError
+        await s.execute(
+            dialect_insert(Song)
+            .values(
+                youtube_id=final_youtube_id,
+                title=result.title,
+                artist=result.artist,
+                duration=result.duration or 0,
+                file_path="",
+                thumbnail=thumbnail,
+            )
+            .on_conflict_do_nothing(index_elements=[Song.youtube_id])
+        )
+        await s.commit()
+    return final_youtube_id
+
+
 async def process_youtube_link(m: Message, url: str):
     """Process YouTube links for music recognition"""
     logger.info(f"🔵 Processing YouTube link: {url}")
     
-    # Get user language
-    async with SessionLocal() as s:
-        user = (await s.execute(select(User).where(User.tg_id == m.from_user.id))).scalars().first()
-    lang = user.language if user and getattr(user, "language", None) else "az"
+    # Get user language (cached - no DB session for the lookup)
+    lang = await get_user_lang(m.from_user.id)
     
     # Send processing message
     status_msg = await m.answer(t(lang, "recognition.processing", platform="YouTube"))
@@ -506,58 +647,23 @@ async def process_youtube_link(m: Message, url: str):
         result = await recognition_service.recognize_from_file(audio_path)
         
         # Clean up audio file
-        try:
-            os.remove(audio_path)
-            temp_dir = os.path.dirname(audio_path)
-            if os.path.exists(temp_dir):
-                for f in os.listdir(temp_dir):
-                    try:
-                        os.unlink(os.path.join(temp_dir, f))
-                    except:
-                        pass
-                os.rmdir(temp_dir)
-        except:
-            pass
+        await asyncio.to_thread(_remove_temp_dir, os.path.dirname(audio_path))
             
         if not result or not result.title:
             await status_msg.edit_text(t(lang, "recognition.recognition_failed"))
             return
             
-        # Save to database
-        async with SessionLocal() as s:
-            final_youtube_id = result.youtube_id or f"rec_youtube_{m.from_user.id}_{m.message_id}"
-            song = (
-                await s.execute(select(Song).where(Song.youtube_id == final_youtube_id))
-            ).scalars().first()
-            
-            if not song and result.title:
-                song = Song(
-                    youtube_id=final_youtube_id,
-                    title=result.title,
-                    artist=result.artist,
-                    duration=result.duration or 0,
-                    file_path="",
-                    thumbnail=video_info.get("thumbnail", "") if video_info else "",
-                )
-                s.add(song)
-                await s.commit()
-                await s.refresh(song)
-        
-        # Send result
-        result_text = t(
-            lang,
-            "recognition.from_video",
-            title=result.title,
-            artist=result.artist,
+        song_yt_id = await _save_recognized_song(
+            result,
+            f"rec_youtube_{m.from_user.id}_{m.message_id}",
+            thumbnail=video_info.get("thumbnail", "") if video_info else "",
         )
         
-        await status_msg.edit_text(result_text)
-        
-        if song:
-            await m.answer(
-                t(lang, "recognition.song_info"),
-                reply_markup=song_actions(_lang(lang), str(song.id))
-            )
+        # Result and song buttons go into the status message - no extra message
+        await status_msg.edit_text(
+            t(lang, "recognition.from_video", title=result.title, artist=result.artist),
+            reply_markup=song_actions_cached(lang, song_yt_id) if song_yt_id else None,
+        )
         
     except Exception as e:
         logger.error(f"Error processing YouTube link: {e}", exc_info=True)
@@ -567,203 +673,97 @@ async def process_youtube_link(m: Message, url: str):
 @router.message(F.video | F.video_note)
 async def on_video_for_recognition(m: Message):
     """Handle video files for music recognition"""
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == m.from_user.id))
-        ).scalars().first()
-    
-    lang = user.language if user and getattr(user, "language", None) else "az"
-    
-    status_msg = await m.answer(t(lang, "recognition.processing_video"))
-    
     temp_dir = tempfile.mkdtemp()
-    video_path = os.path.join(temp_dir, "video.mp4")
-    audio_path = os.path.join(temp_dir, "audio.wav")
-    
+    download: Optional[asyncio.Task] = None
     try:
-        # Download video
-        if m.video:
-            file = await m.bot.get_file(m.video.file_id)
-        else:  # video_note
-            file = await m.bot.get_file(m.video_note.file_id)
+        # Start the download right away - it runs while the status message is sent
+        # (bot.download resolves the file path itself)
+        video_path = os.path.join(temp_dir, "video.mp4")
+        download = asyncio.create_task(m.bot.download(m.video or m.video_note, destination=video_path))
         
-        await m.bot.download_file(file.file_path, destination=video_path)
+        # Cached language - no DB session for the lookup
+        lang = await get_user_lang(m.from_user.id)
         
-        # Extract audio (first 30 seconds)
-        extracted = extract_audio_from_video(
-            video_path,
-            output_path=audio_path,
-            duration=30,
-            start_time=0
-        )
+        status_msg = await m.answer(t(lang, "recognition.processing_video"))
         
-        if not extracted:
-            await status_msg.edit_text(t(lang, "recognition.audio_extraction_failed"))
-            return
-        
-        # Recognize
-        recognition_service = get_recognition_service()
-        result = await recognition_service.recognize_from_file(extracted)
-        
-        # Cleanup
         try:
-            for f in [video_path, audio_path]:
-                if os.path.exists(f):
-                    os.unlink(f)
-            os.rmdir(temp_dir)
-        except:
-            pass
-        
-        if not result:
-            await status_msg.edit_text(t(lang, "recognition.not_found"))
-            return
-        
-        # Save to database
-        async with SessionLocal() as s:
-            final_youtube_id = result.youtube_id or f"rec_video_{m.from_user.id}_{m.message_id}"
-            song = (
-                await s.execute(select(Song).where(Song.youtube_id == final_youtube_id))
-            ).scalars().first()
+            await download
             
-            if not song and result.title:
-                song = Song(
-                    youtube_id=final_youtube_id,
-                    title=result.title,
-                    artist=result.artist,
-                    duration=result.duration or 0,
-                    file_path="",
-                    thumbnail="",
-                )
-                s.add(song)
-                await s.commit()
-                await s.refresh(song)
-        
-        # Send result
-        result_text = t(
-            lang,
-            "recognition.from_video",
-            title=result.title,
-            artist=result.artist,
-        )
-        
-        await status_msg.edit_text(result_text)
-        
-        if song:
-            await m.answer(
-                t(lang, "recognition.song_info"),
-                reply_markup=song_actions(_lang(lang), str(song.id))
+            # Extract a short clip straight into memory
+            audio_data = await extract_audio_bytes(video_path, duration=RECOGNITION_SNIPPET_SECONDS)
+            
+            if not audio_data:
+                await status_msg.edit_text(t(lang, "recognition.audio_extraction_failed"))
+                return
+            
+            # Recognize
+            recognition_service = get_recognition_service()
+            result = await recognition_service.recognize_from_bytes(audio_data, format_hint="mp3")
+            
+            if not result:
+                await status_msg.edit_text(t(lang, "recognition.not_found"))
+                return
+            
+            song_yt_id = await _save_recognized_song(result, f"rec_video_{m.from_user.id}_{m.message_id}")
+            
+            # Result and song buttons go into the status message - no extra message
+            await status_msg.edit_text(
+                t(lang, "recognition.from_video", title=result.title, artist=result.artist),
+                reply_markup=song_actions_cached(lang, song_yt_id) if song_yt_id else None,
             )
-    
-    except Exception as e:
-        logger.error(f"Video recognition error: {e}", exc_info=True)
-        await status_msg.edit_text(t(lang, "recognition.error"))
-        # Cleanup on error
-        try:
-            for f in [video_path, audio_path]:
-                if os.path.exists(f):
-                    os.unlink(f)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
-        except:
-            pass
+        
+        except Exception as e:
+            logger.error(f"Video recognition error: {e}", exc_info=True)
+            await status_msg.edit_text(t(lang, "recognition.error"))
+    finally:
+        # Also runs when the status message couldn't be sent
+        if download:
+            _discard_task(download)
+        await asyncio.to_thread(_remove_temp_dir, temp_dir)
 
 
 @router.message(F.voice)
 async def on_voice_for_recognition(m: Message):
     """Handle voice messages for humming/whistling recognition"""
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == m.from_user.id))
-        ).scalars().first()
-    
-    lang = user.language if user and getattr(user, "language", None) else "az"
-    
-    status_msg = await m.answer(t(lang, "recognition.processing_voice"))
-    
-    temp_dir = tempfile.mkdtemp()
-    ogg_path = os.path.join(temp_dir, "voice.ogg")
-    wav_path = os.path.join(temp_dir, "voice.wav")
-    
+    download: Optional[asyncio.Task] = None
     try:
-        # Download voice
-        file = await m.bot.get_file(m.voice.file_id)
-        await m.bot.download_file(file.file_path, destination=ogg_path)
-        
-        # Convert to WAV (mono, 16-bit, 44.1 kHz)
-        converted = convert_audio_format(
-            ogg_path,
-            output_path=wav_path,
-            format="wav",
-            sample_rate=44100,
-            channels=1
-        )
+        # Download voice into memory (no temp file) while the status message is sent
+        download = asyncio.create_task(m.bot.download(m.voice))
         
-        if not converted:
-            await status_msg.edit_text(t(lang, "recognition.audio_conversion_failed"))
-            return
+        # Cached language - no DB session for the lookup
+        lang = await get_user_lang(m.from_user.id)
         
-        # Recognize with humming mode
-        recognition_service = get_recognition_service()
-        result = await recognition_service.recognize_from_file(wav_path, mode="humming")
+        status_msg = await m.answer(t(lang, "recognition.processing_voice"))
         
-        # Cleanup
         try:
-            for f in [ogg_path, wav_path]:
-                if os.path.exists(f):
-                    os.unlink(f)
-            os.rmdir(temp_dir)
-        except:
-            pass
-        
-        if not result:
-            await status_msg.edit_text(t(lang, "recognition.not_found"))
-            return
-        
-        # Save to database
-        async with SessionLocal() as s:
-            final_youtube_id = result.youtube_id or f"rec_voice_{m.from_user.id}_{m.message_id}"
-            song = (
-                await s.execute(select(Song).where(Song.youtube_id == final_youtube_id))
-            ).scalars().first()
+            voice_data = (await download).getvalue()
             
-            if not song and result.title:
-                song = Song(
-                    youtube_id=final_youtube_id,
-                    title=result.title,
-                    artist=result.artist,
-                    duration=result.duration or 0,
-                    file_path="",
-                    thumbnail="",
-                )
-                s.add(song)
-                await s.commit()
-                await s.refresh(song)
-        
-        # Send result
-        result_text = t(
-            lang,
-            "recognition.from_voice",
-            title=result.title,
-            artist=result.artist,
-        )
-        
-        await status_msg.edit_text(result_text)
-        
-        if song:
-            await m.answer(
-                t(lang, "recognition.song_info"),
-                reply_markup=song_actions(_lang(lang), str(song.id))
+            # Recognize with humming mode - AudD accepts Telegram's OGG/Opus as-is
+            recognition_service = get_recognition_service()
+            result = await recognition_service.recognize_from_bytes(voice_data, mode="humming", format_hint="ogg")
+            
+            if not result:
+                # No melody match - the user may have said the song's name; show what
+                # Vosk heard (when it is configured) so it can be searched
+                transcript = await transcribe_voice(voice_data)
+                if transcript:
+                    await status_msg.edit_text(f"{t(lang, 'recognition.not_found')}\n\n🔎 {html.escape(transcript)}")
+                else:
+                    await status_msg.edit_text(t(lang, "recognition.not_found"))
+                return
+            
+            song_yt_id = await _save_recognized_song(result, f"rec_voice_{m.from_user.id}_{m.message_id}")
+            
+            # Result and song buttons go into the status message - no extra message
+            await status_msg.edit_text(
+                t(lang, "recognition.from_voice", title=result.title, artist=result.artist),
+                reply_markup=song_actions_cached(lang, song_yt_id) if song_yt_id else None,
             )
-    
-    except Exception as e:
-        logger.error(f"Voice recognition error: {e}", exc_info=True)
-        await status_msg.edit_text(t(lang, "recognition.error"))
-        # Cleanup on error
-        try:
-            for f in [ogg_path, wav_path]:
-                if os.path.exists(f):
-                    os.unlink(f)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
-        except:
-            pass
\ No newline at end of file
+        
+        except Exception as e:
+            logger.error(f"Voice recognition error: {e}", exc_info=True)
+            await status_msg.edit_text(t(lang, "recognition.error"))
+    finally:
+        # Also runs when the status message couldn't be sent
+        if download:
+            _discard_task(download)
@@ -6,29 +6,218 @@ from aiogram.types import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
 )
-from sqlalchemy import select
-from db import SessionLocal
-from models import User, Song, Favorite, RequestLog
+from sqlalchemy import select, update, insert, delete, func, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import SessionLocal, dialect_insert
+from config import settings
+from models import Song, Favorite, QueryCache
 from i18n import t
-from keyboards import song_actions, effects_menu
+from keyboards import (
+    song_actions_cached,
+    effects_menu_cached,
+    SongCallback,
+    FxCallback,
+    SearchCallback,
+)
 from services.search_service import get_search_service, SearchResult
 from services.lyrics import get_lyrics
 from services.audio import apply_effects
-from utils.common import has_ffmpeg
+from services.user_service import get_user_lang, get_user_cached
+from services.request_log import queue_request_log
+from services.cache import (
+    user_lyrics_cache,
+    user_lyrics_key,
+    translation_cache,
+    text_translation_key,
+    search_cache,
+    search_key,
+    normalize_query,
+    song_lyrics_cache,
+    song_lyrics_key,
+)
+from utils.common import has_ffmpeg, path_exists, path_size, UPLOAD_CHUNK_SIZE
+from utils.chat_queue import run_in_chat
+from utils.single_flight import single_flight
 from deep_translator import GoogleTranslator
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import asyncio
+import html
 import os
+import re
 import logging
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-# 🔐 user+song əsaslı söz yaddaşı
-user_lyrics_memory: dict[tuple[int, str], str] = {}
+# Song keys as stored in Song.youtube_id: a YouTube video id, or a
+# tiktok_/instagram_/rec_ key written by the recognition handlers
+_SONG_ID_RE = re.compile(r"[A-Za-z0-9_-]{11}|(?:tiktok|instagram|rec)_[A-Za-z0-9_-]{1,54}")
+# Plain YouTube video id (the prefixed keys can also be 11 chars long)
+_YT_VIDEO_ID_RE = re.compile(r"(?!(?:tiktok|instagram|rec)_)[A-Za-z0-9_-]{11}")
 
 # Initialize search service
 search_service = get_search_service()
 
+# Sözlərin altındakı düymə — mətn dəyişmir, yalnız yt_id dəyişir
+TRANSLATE_BUTTON_TEXT = "🇦🇿 Tərcümə et"
+
+# Translated lyrics are kept much longer than the default cache TTL
+TRANSLATION_TTL_SECONDS = 24 * 3600
+
+# How long a stored query -> video mapping is trusted
+QUERY_CACHE_TTL = timedelta(days=90)
+
+# Cap concurrent yt-dlp downloads / ffmpeg renders; further jobs queue here
+_heavy_jobs = asyncio.Semaphore(settings.MAX_CONCURRENT_DOWNLOADS)
+
+
+
+async def _upsert_song(s: AsyncSession, yt_result) -> Song:
+    """Insert the downloaded song, or fill in its file_path if the row exists without one"""
+    stmt = dialect_insert(Song).values(
+        youtube_id=yt_result.youtube_id,
+        title=yt_result.title,
+        artist=yt_result.artist,
+        duration=yt_result.duration,
+        file_path=yt_result.file_path,
+        thumbnail=yt_result.thumbnail,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Song.youtube_id],
+        set_={
+            "file_path": func.coalesce(
+                func.nullif(Song.file_path, ""), stmt.excluded.file_path
+            )
+        },
+    ).returning(Song)
+    return await s.scalar(stmt, execution_options={"populate_existing": True})
+
+
+@lru_cache(maxsize=16)
+def _translator(lang: str) -> GoogleTranslator:
+    """One GoogleTranslator per target language, reused across calls"""
+    return GoogleTranslator(source="auto", target=lang)
+
+
+async def _reject_bad_song_id(c: CallbackQuery, yt_id: str) -> bool:
+    """Answer (and report True) for malformed ids, before any DB work"""
+    if _SONG_ID_RE.fullmatch(yt_id):
+        return False
+    await c.answer("⚠️ Yanlış mahnı ID-si", show_alert=True)
+    return True
+
+
+async def _song_for_query(text: str) -> Song | None:
+    """Downloaded song a previous identical query resolved to, if still fresh"""
+    async with SessionLocal() as s:
+        return await s.scalar(
+            select(Song)
+            .join(QueryCache, QueryCache.youtube_id == Song.youtube_id)
+            .where(
+                QueryCache.normalized_query == normalize_query(text),
+                QueryCache.created_at > datetime.now(timezone.utc) - QUERY_CACHE_TTL,
+                Song.file_path != "",
+            )
+        )
+
+
+async def _remember_query(s: AsyncSession, text: str, yt_id: str) -> None:
+    """Store (or refresh) the query -> video mapping"""
+    stmt = dialect_insert(QueryCache).values(
+        normalized_query=normalize_query(text), youtube_id=yt_id
+    )
+    await s.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[QueryCache.normalized_query],
+            set_={"youtube_id": stmt.excluded.youtube_id, "created_at": func.now()},
+        )
+    )
+
+
+async def _cached_search(text: str) -> list[SearchResult]:
+    """search_from_any_source() behind the search cache, single-flight per query"""
+    key = search_key(text)
+    results = search_cache.get(key)
+    if results is not None:
+        return results
+
+    async def _fetch() -> list[SearchResult]:
+        results = await search_service.search_from_any_source(text)
+        if results:
+            search_cache.set(key, results)
+        return results
+
+    # Identical concurrent queries share one search
+    return await single_flight(key, _fetch)
+
+
+async def _song_by_yt(s: AsyncSession, yt_id: str) -> Song | None:
+    """Song by its unique youtube_id — a single scalar fetch, no Result wrapping"""
+    return await s.scalar(select(Song).where(Song.youtube_id == yt_id))
+
+
+async def _ensure_song_file(c: CallbackQuery, song: Song) -> bool:
+    """
+    Make sure song.file_path is on disk, downloading it again if it was
+    cleaned up (or never fetched). Call it with no session open - the
+    download holds no DB connection, and the new path is written in a
+    short session of its own. Returns False after telling the user when
+    the download fails.
+    """
+    if song.file_path and await path_exists(song.file_path):
+        return True
+
+    await c.message.answer("⏳ Fayl yüklənir...")
+
+    try:
+        from services.youtube import download_from_url, search_and_download
+
+        is_youtube = bool(_YT_VIDEO_ID_RE.fullmatch(song.youtube_id))
+        # If it's a YouTube ID, try to download
+        if is_youtube:
+            yt_url = f"https://www.youtube.com/watch?v={song.youtube_id}"
+            async with _heavy_jobs:
+                yt_result = await download_from_url(yt_url)
+        else:
+            search_query = f"{song.artist} {song.title}"
+            async with _heavy_jobs:
+                yt_result = await search_and_download(search_query)
+
+        async with SessionLocal() as s:
+            song_ids = [song.id]
+            if not is_youtube:
+                # The video gets (or already has) its own row; youtube_id is
+                # unique, so this rec_/tiktok_ row can't be renamed onto it
+                song_ids.append((await _upsert_song(s, yt_result)).id)
+            # Both rows share the file; a stale path on an existing row is replaced
+            await s.execute(
+                update(Song).where(Song.id.in_(song_ids)).values(file_path=yt_result.file_path)
+            )
+            await s.commit()
+        song.file_path = yt_result.file_path
+    except Exception as download_error:
+        logger.error(f"Failed to download song: {download_error}")
+        await c.message.answer("❌ Mahnı yüklənə bilmədi. Zəhmət olmasa yenidən cəhd edin.")
+        return False
+
+    return True
+
+
+async def _load_song(yt_id: str) -> Song | None:
+    """_song_by_yt() in its own short-lived session"""
+    async with SessionLocal() as s:
+        return await _song_by_yt(s, yt_id)
+
+
+def _format_duration(seconds: int) -> str:
+    """Duration as M:SS, or "?" when unknown"""
+    if not seconds or seconds <= 0:
+        return "?"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
 # =================================================================
 # 🔍 UNIFIED SEARCH HANDLER
 # =================================================================
@@ -40,20 +229,38 @@ async def on_query(m: Message):
     - YouTube/TikTok/Instagram links
     - General music search terms
     """
+    # Runs on the chat's queue: one chat's download never holds up another chat
+    run_in_chat(m.chat.id, lambda: _process_query(m))
+
+
+async def _process_query(m: Message):
     text = m.text.strip()
     logger.info(f"[SEARCH] Processing query: {text[:100]}")
     
     # Get user language
-    async with SessionLocal() as session:
-        user = await session.get(User, m.from_user.id)
-        lang = user.language if user else 'az'
+    lang = await get_user_lang(m.from_user.id)
     
     # Show typing action
     await m.bot.send_chat_action(m.chat.id, "typing")
     
     try:
-        # Process the query using our unified search service
-        results = await search_service.search_from_any_source(text)
+        # A query answered before (even before a restart) skips yt-dlp entirely
+        known = await _song_for_query(text)
+        if known:
+            results = [
+                SearchResult(
+                    source="youtube",
+                    title=known.title,
+                    artist=known.artist,
+                    duration=known.duration,
+                    thumbnail=known.thumbnail,
+                    youtube_id=known.youtube_id,
+                    file_path=known.file_path,
+                )
+            ]
+        else:
+            # Process the query using our unified search service
+            results = await _cached_search(text)
         
         if not results:
             await m.answer(t(lang, "no_results"))
@@ -65,15 +272,20 @@ async def on_query(m: Message):
             return
             
         # If we have multiple results, show them to the user
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-        for i, result in enumerate(results[:5], 1):  # Show max 5 results
-            title = f"{i}. {result.artist} - {result.title}" if result.artist else result.title
-            callback_data = f"search_select:{result.source}:{getattr(result, f'{result.source}_id', '')}"
-            keyboard.inline_keyboard.append([
-                InlineKeyboardButton(text=title[:64], callback_data=callback_data)
+        shown = results[:5]  # Show max 5 results
+        parts = [f"🔍 <b>{len(shown)} nəticə tapıldı:</b>\n\n"]
+        rows = []
+        for i, result in enumerate(shown, 1):
+            title = f"{result.artist} - {result.title}" if result.artist else result.title
+            parts.append(f"{i}. <b>{html.escape(title)}</b> | ⏱ {_format_duration(result.duration)}\n")
+            rows.append([
+                InlineKeyboardButton(
+                    text=f"{i}. {title[:35]}{'…' if len(title) > 35 else ''}",
+                    callback_data=SearchCallback(action="select", yt_id=result.youtube_id or "").pack(),
+                )
             ])
-            
-        await m.answer("🔍 Aşağıdakı nəticələrdən birini seçin:", reply_markup=keyboard)
+
+        await m.answer("".join(parts), reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
         
     except Exception as e:
         logger.error(f"Search error: {e}", exc_info=True)
@@ -82,64 +294,68 @@ async def on_query(m: Message):
 async def process_search_result(m: Message, result: SearchResult, lang: str):
     """Process a single search result and send it to the user"""
     try:
-        # If we have a file path, send the audio
-        if result.file_path and os.path.exists(result.file_path):
-            audio = FSInputFile(result.file_path)
-            from i18n import _load as _lang
+        file_path = result.file_path
+        if not (file_path and await path_exists(file_path)) and result.youtube_id:
+            # Search results carry no local path - reuse an earlier download if there is one
+            async with SessionLocal() as s:
+                file_path = await s.scalar(
+                    select(Song.file_path).where(Song.youtube_id == result.youtube_id)
+                )
+
+        # If we have a file on disk, send the audio straight away
+        if file_path and await path_exists(file_path):
+            audio = FSInputFile(file_path, chunk_size=UPLOAD_CHUNK_SIZE)
             await m.answer_audio(
                 audio=audio,
                 title=result.title,
                 performer=result.artist,
-                reply_markup=song_actions(_lang(lang), result.youtube_id)
+                reply_markup=song_actions_cached(lang, result.youtube_id)
             )
         else:
-            # If no file path, download the song first
-            await m.answer(t(lang, "downloading"))
-            
             try:
                 # Download the song
                 if result.source == 'youtube' and result.youtube_id:
                     from services.youtube import search_and_download
                     
+                    # Only now is a download certain - tell the user
+                    await m.answer(t(lang, "downloading"))
+                    
                     # Try to download using the search query or direct download
                     search_query = f"{result.artist} {result.title}".strip()
-                    yt_result = await search_and_download(search_query)
+                    async with _heavy_jobs:
+                        yt_result = await search_and_download(search_query)
                     
-                    if yt_result and yt_result.file_path and os.path.exists(yt_result.file_path):
+                    if yt_result and yt_result.file_path and await path_exists(yt_result.file_path):
                         # Save to database
-                        await save_song_to_db(yt_result, m.from_user.id, search_query)
+                        await save_song_to_db(yt_result, m.from_user.id, search_query, user_query=m.text)
                         
                         # Send the audio file
-                        from i18n import _load as _lang
-                        audio = FSInputFile(yt_result.file_path)
+                        audio = FSInputFile(yt_result.file_path, chunk_size=UPLOAD_CHUNK_SIZE)
                         await m.answer_audio(
                             audio=audio,
                             title=yt_result.title,
                             performer=yt_result.artist,
-                            reply_markup=song_actions(_lang(lang), yt_result.youtube_id)
+                            reply_markup=song_actions_cached(lang, yt_result.youtube_id)
                         )
                     else:
                         # If download failed, show info with download button
-                        from i18n import _load as _lang
                         await m.answer(
                             f"🎵 {result.artist} - {result.title}",
-                            reply_markup=song_actions(_lang(lang), result.youtube_id)
+                            reply_markup=song_actions_cached(lang, result.youtube_id)
                         )
                 else:
                     # For non-YouTube sources, show info with download button
-                    from i18n import _load as _lang
                     await m.answer(
                         f"🎵 {result.artist} - {result.title}",
-                        reply_markup=song_actions(_lang(lang), result.youtube_id)
+                        reply_markup=song_actions_cached(lang, result.youtube_id)
                     )
                     
             except Exception as download_error:
                 logger.error(f"Failed to download song: {download_error}")
                 # Show info with download button as fallback
-                from i18n import _load as _lang
                 await m.answer(
                     f"🎵 {result.artist} - {result.title}",
-                    reply_markup=song_actions(_lang(lang), result.youtube_id)
+                    reply_markup=song_actions_cached(lang, result.youtube_id)
                 )
             
         # Log the request
@@ -149,310 +365,149 @@ async def process_search_result(m: Message, result: SearchResult, lang: str):
         logger.error(f"Error processing search result: {e}", exc_info=True)
         await m.answer(t(lang, "error_processing_media"))
 
-async def save_song_to_db(yt_result, user_id: int, query: str):
-    """Save downloaded song to database"""
+async def save_song_to_db(yt_result, user_id: int, query: str, user_query: str | None = None):
+    """Save downloaded song to database (and what the user typed to find it)"""
     try:
         async with SessionLocal() as s:
-            # Check if song already exists
-            existing_song = (
-                await s.execute(select(Song).where(Song.youtube_id == yt_result.youtube_id))
-            ).scalars().first()
-            
-            if not existing_song:
-                song = Song(
-                    youtube_id=yt_result.youtube_id,
-                    title=yt_result.title,
-                    artist=yt_result.artist,
-                    duration=yt_result.duration,
-                    file_path=yt_result.file_path,
-                    thumbnail=yt_result.thumbnail,
-                )
-                s.add(song)
-                await s.commit()
-                await s.refresh(song)
-            else:
-                # Update file path if it was missing
-                if not existing_song.file_path and yt_result.file_path:
-                    existing_song.file_path = yt_result.file_path
-                    await s.commit()
-                song = existing_song
+            song = await _upsert_song(s, yt_result)
+            if user_query:
+                await _remember_query(s, user_query, song.youtube_id)
+            await s.commit()
             
-            # Log the request
-            user = await s.get(User, user_id)
-            if user:
-                s.add(
-                    RequestLog(
-                        user_id=user.id,
-                        query=query,
-                        via_voice=False,
-                        matched_song_id=song.id,
-                    )
-                )
-                await s.commit()
-                
+        # Log the request (written in the background)
+        queue_request_log(user_id, query, matched_song_id=song.id)
+
     except Exception as e:
         logger.error(f"Failed to save song to database: {e}")
 
 async def log_request(m: Message, result: SearchResult):
-    """Log the user's request to the database"""
-    try:
-        async with SessionLocal() as session:
-            # Log the request
-            request = RequestLog(
-                user_id=m.from_user.id,
-                query=m.text,
-                source=result.source,
-                title=result.title,
-                artist=result.artist,
-                duration=result.duration,
-                created_at=datetime.now(timezone.utc)
-            )
-            session.add(request)
-            await session.commit()
-    except Exception as e:
-        logger.error(f"Error logging request: {e}")
-        # Don't fail the whole request if logging fails
-    
-    logger.info(f"[SEARCH] Processing search query")
-    
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == m.from_user.id))
-        ).scalars().first()
-
-    lang = user.language if user and getattr(user, "language", None) else "az"
-
-    if not has_ffmpeg():
-        await m.answer(t(lang, "no_ffmpeg"))
-        return
-
-    # Send searching message
-    search_msg = await m.answer("🔍 Axtarılır...")
-
-    try:
-        # Search for multiple results
-        results = await search_multiple(m.text.strip(), max_results=5)
-        
-        if not results:
-            await search_msg.edit_text("❌ Nəticə tapılmadı. Zəhmət olmasa başqa sorğu yazın.")
-            return
-
-        # Show results with inline keyboard
-        from i18n import _load as _lang
-        lang_texts = _lang(lang)
-        
-        results_text = f"🔍 <b>{len(results)} nəticə tapıldı:</b>\n\n"
-        keyboard_buttons = []
-        
-        for idx, result in enumerate(results, 1):
-            # Format duration as MM:SS
-            if result.duration > 0:
-                minutes = result.duration // 60
-                seconds = result.duration % 60
-                duration_str = f"{minutes}:{seconds:02d}"
-            else:
-                duration_str = "?"
-            
-            results_text += f"{idx}. <b>{result.title}</b>\n"
-            results_text += f"   👤 {result.artist} | ⏱ {duration_str}\n\n"
-            
-            # Add button for each result (truncate title if too long)
-            button_text = f"{idx}. {result.title[:35]}"
-            if len(result.title) > 35:
-                button_text += "..."
-            
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    text=button_text,
-                    callback_data=f"search:select:{result.youtube_id}"
-                )
-            ])
-        
-        await search_msg.edit_text(
-            results_text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons),
-            parse_mode="HTML"
-        )
-        
-    except Exception as e:
-        logger.error(f"Search error: {e}", exc_info=True)
-        await search_msg.edit_text("❌ Axtarış zamanı xəta baş verdi.")
+    """Queue the user's request for the background log writer"""
+    queue_request_log(m.from_user.id, m.text or result.title)
 
 
 # =================================================================
 # 🔍 SEARCH RESULT SELECTION
 # =================================================================
-@router.callback_query(F.data.startswith("search:select:"))
-async def on_search_select(c: CallbackQuery):
+@router.callback_query(SearchCallback.filter(F.action == "select"))
+async def on_search_select(c: CallbackQuery, callback_data: SearchCallback):
     """Handle selection of a search result"""
     await c.answer()
     
-    yt_id = c.data.split(":")[-1]
-    
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == c.from_user.id))
-        ).scalars().first()
+    yt_id = callback_data.yt_id
     
-    lang = user.language if user and getattr(user, "language", None) else "az"
-    
-    # Check if song already exists in DB
+    # Language comes from the user cache - only the song needs the DB
+    lang = await get_user_lang(c.from_user.id)
+
+    # One session for the whole selection: the read and the insert
     async with SessionLocal() as s:
-        song = (
-            await s.execute(select(Song).where(Song.youtube_id == yt_id))
-        ).scalars().first()
-    
-    if not song:
-        # Download the selected song
-        await c.message.answer(t(lang, "downloading"))
+        song = await _song_by_yt(s, yt_id)
         
-        try:
-            from services.youtube import download_from_url
-            yt_url = f"https://www.youtube.com/watch?v={yt_id}"
-            yt_result = await download_from_url(yt_url)
+        if not song:
+            # End the read transaction so no pooled connection is held during the download
+            await s.commit()
             
-            # Save to database
-            async with SessionLocal() as s:
-                # Check if song already exists
-                existing_song = (
-                    await s.execute(select(Song).where(Song.youtube_id == yt_result.youtube_id))
-                ).scalars().first()
+            # Download the selected song
+            await c.message.answer(t(lang, "downloading"))
+            
+            try:
+                from services.youtube import download_from_url
+                yt_url = f"https://www.youtube.com/watch?v={yt_id}"
+                async with _heavy_jobs:
+                    yt_result = await download_from_url(yt_url)
                 
-                if existing_song:
-                    song = existing_song
-                    # Update file path if it was missing
-                    if not existing_song.file_path and yt_result.file_path:
-                        existing_song.file_path = yt_result.file_path
-                        await s.commit()
-                else:
-                    song = Song(
-                        youtube_id=yt_result.youtube_id,
-                        title=yt_result.title,
-                        artist=yt_result.artist,
-                        duration=yt_result.duration,
-                        file_path=yt_result.file_path,
-                        thumbnail=yt_result.thumbnail,
-                    )
-                    s.add(song)
-                    await s.commit()
-                    await s.refresh(song)
+                # Save to database (another user may have added it meanwhile)
+                song = await _upsert_song(s, yt_result)
+                await s.commit()
                 
-                # Log request
-                if user:
-                    s.add(
-                        RequestLog(
-                            user_id=user.id,
-                            query=yt_result.title,
-                            via_voice=False,
-                            matched_song_id=song.id,
-                        )
-                    )
-                    await s.commit()
-            
-            # Send result
-            from i18n import _load as _lang
-            result_text = t(
-                lang,
-                "search_result",
-                title=yt_result.title,
-                artist=yt_result.artist,
-                duration=yt_result.duration,
-            )
-            
-            await c.message.answer(result_text)
-            await c.message.answer(
-                t(lang, "recognition.song_info"),
-                reply_markup=song_actions(_lang(lang), song.youtube_id)
-            )
-        except Exception as e:
-            logger.error(f"Error downloading selected song: {e}", exc_info=True)
-            await c.message.answer("❌ Mahnı yüklənə bilmədi.")
-    else:
-        # Song already exists, just show it
-        from i18n import _load as _lang
-        result_text = t(
-            lang,
-            "search_result",
-            title=song.title,
-            artist=song.artist,
-            duration=song.duration,
-        )
-        
-        await c.message.answer(result_text)
-        await c.message.answer(
-            t(lang, "recognition.song_info"),
-            reply_markup=song_actions(_lang(lang), song.youtube_id)
-        )
+                # Log request (written in the background)
+                queue_request_log(c.from_user.id, yt_result.title, matched_song_id=song.id)
+                
+                # Send result
+                result_text = t(
+                    lang,
+                    "search_result",
+                    title=yt_result.title,
+                    artist=yt_result.artist,
+                    duration=yt_result.duration,
+                )
+                
+                # One message instead of two sequential sends
+                await c.message.answer(
+                    f"{result_text}\n\n{t(lang, 'recognition.song_info')}",
+                    reply_markup=song_actions_cached(lang, song.youtube_id)
+                )
+            except Exception as e:
+                logger.error(f"Error downloading selected song: {e}", exc_info=True)
+                await c.message.answer("❌ Mahnı yüklənə bilmədi.")
+            return
+    
+    # Song already exists, just show it
+    result_text = t(
+        lang,
+        "search_result",
+        title=song.title,
+        artist=song.artist,
+        duration=song.duration,
+    )
+    
+    await c.message.answer(
+        f"{result_text}\n\n{t(lang, 'recognition.song_info')}",
+        reply_markup=song_actions_cached(lang, song.youtube_id)
+    )
 
 
 # =================================================================
 # 🎵 MAHNINI ENDİR
 # =================================================================
-@router.callback_query(F.data.startswith("song:dl:"))
-async def on_download(c: CallbackQuery):
+@router.callback_query(SongCallback.filter(F.action == "dl"))
+async def on_download(c: CallbackQuery, callback_data: SongCallback):
+    yt_id = callback_data.yt_id
+    if await _reject_bad_song_id(c, yt_id):
+        return
+
     # Immediately answer the callback query to prevent timeout
     await c.answer()
+    run_in_chat(c.message.chat.id, lambda: _send_song_file(c, yt_id))
 
-    yt_id = c.data.split(":")[-1]
 
+async def _send_song_file(c: CallbackQuery, yt_id: str):
     async with SessionLocal() as s:
-        song = (
-            await s.execute(select(Song).where(Song.youtube_id == yt_id))
-        ).scalars().first()
-
-        if song:
-            song.play_count += 1
-            song.last_played = datetime.now(timezone.utc)
-            await s.commit()
+        # Bump the counters and fetch the row in one atomic statement
+        song = await s.scalar(
+            update(Song)
+            .where(Song.youtube_id == yt_id)
+            .values(
+                play_count=Song.play_count + 1,
+                last_played=func.now(),  # DB clock, same as created_at
+            )
+            .returning(Song)
+        )
+        await s.commit()
 
     if not song:
         await c.message.answer("Song not found")
         return
 
-    # Inform the user if the file needs to be downloaded
-    if not song.file_path or not os.path.exists(song.file_path):
-        await c.message.answer("⏳ Fayl yüklənir...")
-        
-        try:
-            from services.youtube import download_from_url, search_and_download
-            
-            # If it's a YouTube ID, try to download
-            if song.youtube_id and len(song.youtube_id) == 11 and not song.youtube_id.startswith(("tiktok_", "instagram_", "rec_")):
-                yt_url = f"https://www.youtube.com/watch?v={song.youtube_id}"
-                yt_result = await download_from_url(yt_url)
-                song.file_path = yt_result.file_path
-            else:
-                search_query = f"{song.artist} {song.title}"
-                yt_result = await search_and_download(search_query)
-                song.file_path = yt_result.file_path
-                song.youtube_id = yt_result.youtube_id
-            
-            # Update database
-            async with SessionLocal() as s:
-                db_song = (await s.execute(select(Song).where(Song.id == song.id))).scalars().first()
-                if db_song:
-                    db_song.file_path = song.file_path
-                    db_song.youtube_id = song.youtube_id
-                    await s.commit()
-
-        except Exception as download_error:
-            logger.error(f"Failed to download song: {download_error}")
-            await c.message.answer("❌ Mahnı yüklənə bilmədi. Zəhmət olmasa yenidən cəhd edin.")
-            return
+    if not await _ensure_song_file(c, song):
+        return
 
     # Check file again
-    if not os.path.exists(song.file_path):
+    if not await path_exists(song.file_path):
         await c.message.answer("❌ Fayl tapılmadı.")
         return
 
     try:
         # Check file size (Telegram limit is 50MB)
-        file_size = os.path.getsize(song.file_path)
+        file_size = await path_size(song.file_path)
         if file_size > 50 * 1024 * 1024:  # 50MB
             await c.message.answer("❌ Fayl çox böyükdür (50MB limit).")
             return
         
-        file = FSInputFile(song.file_path, filename=f"{song.title[:50]}.mp3")
+        file = FSInputFile(
+            song.file_path,
+            filename=f"{song.title[:50]}.mp3",
+            chunk_size=UPLOAD_CHUNK_SIZE,
+        )
         await c.message.answer_document(file)
     except Exception as e:
         logger.error(f"Error sending file: {e}", exc_info=True)
@@ -462,21 +517,25 @@ async def on_download(c: CallbackQuery):
 # =================================================================
 # 💬 MAHNININ SÖZLƏRİ
 # =================================================================
-@router.callback_query(F.data.startswith("song:ly:"))
-async def on_lyrics(c: CallbackQuery):
-    await c.answer()  # Dərhal callback cavabı ver
+@router.callback_query(SongCallback.filter(F.action == "ly"))
+async def on_lyrics(c: CallbackQuery, callback_data: SongCallback):
+    yt_id = callback_data.yt_id
+    if await _reject_bad_song_id(c, yt_id):
+        return
 
-    yt_id = c.data.split(":")[-1]
+    await c.answer()  # Dərhal callback cavabı ver
 
-    async with SessionLocal() as s:
-        song = (
-            await s.execute(select(Song).where(Song.youtube_id == yt_id))
-        ).scalars().first()
-        user = (
-            await s.execute(select(User).where(User.tg_id == c.from_user.id))
-        ).scalars().first()
+    # Someone already opened this song's lyrics - no DB lookup, no fetch
+    lyrics = song_lyrics_cache.get(song_lyrics_key(yt_id))
+    if lyrics is not None:
+        user_lyrics_cache.set(user_lyrics_key(c.from_user.id, yt_id), lyrics)
+        await c.message.answer(lyrics, reply_markup=_translate_button(yt_id))
+        return
 
-    lang = user.language if user and getattr(user, "language", None) else "az"
+    # Song row and user language are independent - fetch them concurrently
+    song, lang = await asyncio.gather(
+        _load_song(yt_id), get_user_lang(c.from_user.id)
+    )
 
     if not song:
         await c.message.answer("❌ Mahnı tapılmadı.")
@@ -489,12 +548,12 @@ async def on_lyrics(c: CallbackQuery):
         lyrics = await get_lyrics(song.title, song.artist)
 
         if lyrics:
-            user_lyrics_memory[(c.from_user.id, yt_id)] = lyrics
-            await loading_msg.delete()
-            await c.message.answer(lyrics)
-            await c.message.answer(
-                "🔁 Tərcümə etmək üçün:",
-                reply_markup=_translate_button(yt_id),
+            song_lyrics_cache.set(song_lyrics_key(yt_id), lyrics)
+            user_lyrics_cache.set(user_lyrics_key(c.from_user.id, yt_id), lyrics)
+            # Independent calls - overlap the two round-trips
+            await asyncio.gather(
+                loading_msg.delete(),
+                c.message.answer(lyrics, reply_markup=_translate_button(yt_id)),
             )
         else:
             await loading_msg.edit_text(t(lang, "lyrics_not_found"))
@@ -505,16 +564,13 @@ async def on_lyrics(c: CallbackQuery):
 # =================================================================
 # 🌐 TƏRCÜMƏ
 # =================================================================
-@router.callback_query(F.data.startswith("song:tr:"))
-async def on_translate(c: CallbackQuery):
-    yt_id = c.data.split(":")[-1]
-    text = user_lyrics_memory.get((c.from_user.id, yt_id))
-
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == c.from_user.id))
-        ).scalars().first()
-    lang = user.language if user and getattr(user, "language", None) else "az"
+@router.callback_query(SongCallback.filter(F.action == "tr"))
+async def on_translate(c: CallbackQuery, callback_data: SongCallback):
+    yt_id = callback_data.yt_id
+    text = user_lyrics_cache.get(user_lyrics_key(c.from_user.id, yt_id)) or song_lyrics_cache.get(
+        song_lyrics_key(yt_id)
+    )
+    lang = await get_user_lang(c.from_user.id)
 
     if not text:
         await c.message.answer("❗ Əvvəl sözləri aç (Sözlər düyməsi).")
@@ -522,11 +578,20 @@ async def on_translate(c: CallbackQuery):
 
     await c.message.answer("🔄 Tərcümə olunur...")
 
-    try:
-        translated = GoogleTranslator(source="auto", target=lang).translate(text)
-    except Exception as e:
-        await c.message.answer(f"❌ Tərcümə xətası: {e}")
-        return
+    key = text_translation_key(text, lang)
+    translated = translation_cache.get(key)
+    if translated is None:
+        try:
+            # translate() is a blocking HTTP call - keep it off the event loop
+            translated = await asyncio.to_thread(_translator(lang).translate, text)
+        except Exception as e:
+            await c.message.answer(f"❌ Tərcümə xətası: {e}")
+            return
+        # Lyrics translations don't go stale - keep them for a day
+        translation_cache.set(key, translated, ttl=TRANSLATION_TTL_SECONDS)
+
+    # Translated - the per-user copy is no longer needed (song_lyrics_cache still has the text)
+    user_lyrics_cache.delete(user_lyrics_key(c.from_user.id, yt_id))
 
     await c.message.answer(f"🇬🇧 ➜ {lang.upper()}\n\n{translated}")
     await c.answer()
@@ -535,56 +600,65 @@ async def on_translate(c: CallbackQuery):
 # =================================================================
 # ⭐ FAVORİTLƏR
 # =================================================================
-@router.callback_query(F.data.startswith("song:fav:"))
-async def on_fav(c: CallbackQuery):
-    yt_id = c.data.split(":")[-1]
+@router.callback_query(SongCallback.filter(F.action == "fav"))
+async def on_fav(c: CallbackQuery, callback_data: SongCallback):
+    yt_id = callback_data.yt_id
+    if await _reject_bad_song_id(c, yt_id):
+        return
 
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == c.from_user.id))
-        ).scalars().first()
-        song = (
-            await s.execute(select(Song).where(Song.youtube_id == yt_id))
-        ).scalars().first()
-
-        if not (user and song):
-            await c.answer("⚠️ Error")
-            return
+    # users.id and language come from one cached lookup - reused by every branch below
+    user_id, lang = await get_user_cached(c.from_user.id)
+    if user_id is None:
+        await c.answer("⚠️ Error")
+        return
 
-        existing = (
-            await s.execute(
-                select(Favorite).where(
-                    Favorite.user_id == user.id,
-                    Favorite.song_id == song.id,
-                )
-            )
-        ).scalars().first()
+    song_id = select(Song.id).where(Song.youtube_id == yt_id).scalar_subquery()
 
-        if existing:
-            await s.delete(existing)
-            await s.commit()
-            await c.answer(_lang(user.language).get("fav_removed", "❌ Silindi"))
-        else:
-            s.add(Favorite(user_id=user.id, song_id=song.id))
-            await s.commit()
-            await c.answer(_lang(user.language).get("fav_added", "⭐ Əlavə edildi"))
+    async with SessionLocal() as s:
+        # Toggle: try to remove first, add only if nothing was removed
+        removed = await s.scalar(
+            delete(Favorite)
+            .where(Favorite.user_id == user_id, Favorite.song_id == song_id)
+            .returning(Favorite.id)
+        )
+        added = 0
+        if removed is None:
+            try:
+                added = (
+                    await s.execute(
+                        insert(Favorite).from_select(
+                            ["user_id", "song_id"],
+                            select(literal(user_id), Song.id).where(Song.youtube_id == yt_id),
+                        )
+                    )
+                ).rowcount
+            except IntegrityError:
+                # A concurrent tap already added it
+                await s.rollback()
+                added = 1
+        await s.commit()
+
+    if removed is None and not added:
+        await c.answer("⚠️ Error")
+        return
+
+    if removed is not None:
+        await c.answer(t(lang, "fav_removed"))
+    else:
+        await c.answer(t(lang, "fav_added"))
 
 
 # =================================================================
 # 🎚️ EFFEKT MENYUSU
 # =================================================================
-@router.callback_query(F.data.startswith("song:fx:"))
-async def on_effects_menu(c: CallbackQuery):
-    yt_id = c.data.split(":")[-1]
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == c.from_user.id))
-        ).scalars().first()
-    lang = user.language if user and getattr(user, "language", None) else "az"
+@router.callback_query(SongCallback.filter(F.action == "fx"))
+async def on_effects_menu(c: CallbackQuery, callback_data: SongCallback):
+    yt_id = callback_data.yt_id
+    lang = await get_user_lang(c.from_user.id)
 
     await c.message.answer(
         t(lang, "choose_effect"),
-        reply_markup=effects_menu(_lang(lang), yt_id),
+        reply_markup=effects_menu_cached(lang, yt_id),
     )
     await c.answer()
 
@@ -592,41 +666,33 @@ async def on_effects_menu(c: CallbackQuery):
 # =================================================================
 # 🎚️ EFFEKT TƏTBİQİ
 # =================================================================
-@router.callback_query(F.data.startswith("fx:"))
-async def on_effect_apply(c: CallbackQuery):
+@router.callback_query(FxCallback.filter())
+async def on_effect_apply(c: CallbackQuery, callback_data: FxCallback):
+    kind, val, yt_id = callback_data.kind, callback_data.value, callback_data.yt_id
+    # Köhnə menyularda yt_id boş gəlir — onları da rədd edirik
+    if await _reject_bad_song_id(c, yt_id):
+        return
+
     await c.answer()
+    run_in_chat(c.message.chat.id, lambda: _apply_effect(c, kind, val, yt_id))
 
-    parts = c.data.split(":")
-    kind, val = parts[1], parts[2]
-    
-    # Extract yt_id from callback data if present (format: fx:kind:val:yt_id)
-    yt_id = None
-    if len(parts) > 3:
-        yt_id = parts[3]
 
-    async with SessionLocal() as s:
-        user = (
-            await s.execute(select(User).where(User.tg_id == c.from_user.id))
-        ).scalars().first()
-        
-        # Try to get song by yt_id first, fallback to last played
-        if yt_id:
-            song = (
-                await s.execute(select(Song).where(Song.youtube_id == yt_id))
-            ).scalars().first()
-        else:
-            song = (
-                await s.execute(select(Song).order_by(Song.last_played.desc()))
-            ).scalars().first()
+async def _apply_effect(c: CallbackQuery, kind: str, val: str, yt_id: str):
+    lang = await get_user_lang(c.from_user.id)
 
-    lang = user.language if user and getattr(user, "language", None) else "az"
+    if not has_ffmpeg():
+        await c.message.answer(t(lang, "no_ffmpeg"))
+        return
+
+    # Short read session - closed before any re-download below
+    song = await _load_song(yt_id)
 
     if not song:
-        await c.message.answer("No context song", show_alert=True)
+        await c.message.answer("❌ Mahnı tapılmadı.")
         return
 
-    if not has_ffmpeg():
-        await c.message.answer(t(lang, "no_ffmpeg"))
+    # ffmpeg needs the audio on disk - fetch it again if it was cleaned up
+    if not await _ensure_song_file(c, song):
         return
 
     await c.message.answer(t(lang, "applying_effect"))
@@ -647,40 +713,38 @@ async def on_effect_apply(c: CallbackQuery):
         effects["speed"] = float(val)
 
     try:
-        new_path = apply_effects(song.file_path, None, effects)
+        # ffmpeg runs as an asyncio subprocess - the loop stays free while it renders
+        async with _heavy_jobs:
+            new_path = await apply_effects(song.file_path, None, effects)
     except Exception as e:
         await c.message.answer(f"❌ Effekt tətbiq xətası: {e}")
         return
 
-    if not os.path.exists(new_path):
+    if not await path_exists(new_path):
         await c.message.answer("❌ Effekt faylı yaradılmadı.")
         return
 
-    file = FSInputFile(new_path, filename=os.path.basename(new_path))
+    file = FSInputFile(
+        new_path,
+        filename=os.path.basename(new_path),
+        chunk_size=UPLOAD_CHUNK_SIZE,
+    )
     await c.message.answer_document(file)
 
 
 # =================================================================
 # 🔘 Tərcümə düyməsi
 # =================================================================
+@lru_cache(maxsize=2048)
 def _translate_button(yt_id: str):
+    """Shared per yt_id — do not modify the returned markup"""
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
-                    text="🇦🇿 Tərcümə et",
-                    callback_data=f"song:tr:{yt_id}",
+                    text=TRANSLATE_BUTTON_TEXT,
+                    callback_data=SongCallback(action="tr", yt_id=yt_id).pack(),
                 )
             ]
         ]
     )
-
-
-# =================================================================
-# 🌍 Dil funksiyaları + helper
-# =================================================================
-def _lang(code: str) -> dict:
-    from i18n import _load
-    return _load(code)
-
-
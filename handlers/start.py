@@ -1,15 +1,18 @@
+import asyncio
+from functools import lru_cache
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.filters import CommandStart, Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select
+from sqlalchemy import func
 
-from db import SessionLocal
+from db import SessionLocal, dialect_insert
 from models import User
-from i18n import t
-from i18n import _load as _lang     # <-- DİL JSON-u yükləmək üçün ƏLAVƏ OLDU
-from keyboards import main_menu
+from i18n import t, SUPPORTED_LANGS, LANG_FLAGS, LANG_NAMES
+from keyboards import main_menu_cached, LangCallback
 from config import settings
+from services.user_service import get_user_cached, get_user_lang, remember_user, touch_user
 
 router = Router()
 
@@ -17,107 +20,99 @@ router = Router()
 # -----------------------------
 # DB user helpers
 # -----------------------------
-async def _get_user(tg_id: int) -> User | None:
-    async with SessionLocal() as s:
-        return (
-            await s.execute(select(User).where(User.tg_id == tg_id))
-        ).scalars().first()
-
-
-async def _create_user(tg_id: int, lang: str = "az") -> User:
+async def _save_user_lang(tg_id: int, lang: str) -> int:
+    """Create the user or update their language in one statement; returns users.id"""
+    stmt = dialect_insert(User).values(tg_id=tg_id, language=lang)
     async with SessionLocal() as s:
-        user = User(tg_id=tg_id, language=lang)
-        s.add(user)
+        user_id = await s.scalar(
+            stmt.on_conflict_do_update(
+                index_elements=[User.tg_id],
+                set_={"language": stmt.excluded.language, "last_seen": func.now()},
+            ).returning(User.id)
+        )
         await s.commit()
-        return user
-
-
-async def _user_lang(tg_id: int) -> str:
-    user = await _get_user(tg_id)
-    return user.language if user else "az"
+    return user_id
 
 
 # -----------------------------
 # Language keyboard
 # -----------------------------
-def language_keyboard():
+def _build_language_keyboard():
     builder = InlineKeyboardBuilder()
-    builder.row(
-        InlineKeyboardButton(
-            text="🇦🇿 Azərbaycan dili",
-            callback_data="setlang:az"
+    for code, name in LANG_NAMES.items():
+        builder.row(
+            InlineKeyboardButton(
+                text=f"{LANG_FLAGS[code]} {name}",
+                callback_data=LangCallback(lang=code).pack()
+            )
         )
-    )
-    builder.row(
-        InlineKeyboardButton(
-            text="🇬🇧 English",
-            callback_data="setlang:en"
-        )
-    )
-    builder.row(
-        InlineKeyboardButton(
-            text="🇷🇺 Русский",
-            callback_data="setlang:ru"
-        )
-    )
     return builder.as_markup()
 
 
+# Dil seçimi hər dildə eynidir — bir dəfə qurulur, paylaşılır (dəyişdirməyin)
+LANGUAGE_KEYBOARD = _build_language_keyboard()
+LANGUAGE_PROMPT = (
+    "🌐 Zəhmət olmasa dil seçin:\n"
+    "Please choose a language:\n"
+    "Пожалуйста, выберите язык:"
+)
+
+
+@lru_cache(maxsize=8)
+def start_text(lang: str) -> str:
+    """Welcome + menu text; the locale strings have no per-user placeholders."""
+    return t(lang, "start_message") + "\n\n" + t(lang, "start_menu")
+
+
 # -----------------------------
 # /start
 # -----------------------------
 @router.message(CommandStart())
 async def on_start(m: Message):
     tg_id = m.from_user.id
-    user = await _get_user(tg_id)
-
-    if not user:
-        await m.answer(
-            "🌐 Zəhmət olmasa dil seçin:\n"
-            "Please choose a language:\n"
-            "Пожалуйста, выберите язык:",
-            reply_markup=language_keyboard()
-        )
+    user_id, lang = await get_user_cached(tg_id)
+
+    if user_id is None:
+        await m.answer(LANGUAGE_PROMPT, reply_markup=LANGUAGE_KEYBOARD)
         return
 
-    lang = user.language or "az"
+    touch_user(tg_id)
     is_admin = tg_id in settings.ADMIN_IDS
 
-    await m.answer(
-        t(lang, "start_message", name=m.from_user.full_name) + "\n\n" +
-        t(lang, "start_menu"),
-        reply_markup=main_menu(_lang(lang), is_admin=is_admin)     # <-- DÜZƏLDİLDİ
-    )
+    await m.answer(start_text(lang), reply_markup=main_menu_cached(lang, is_admin=is_admin))
 
 
 # -----------------------------
 # setlang:xx callback
 # -----------------------------
-@router.callback_query(F.data.startswith("setlang:"))
-async def on_set_lang(c: CallbackQuery):
+@router.callback_query(LangCallback.filter())
+async def on_set_lang(c: CallbackQuery, callback_data: LangCallback):
     tg_id = c.from_user.id
-    lang = c.data.split(":")[1]
-
-    user = await _get_user(tg_id)
-
-    if not user:
-        await _create_user(tg_id, lang)
-    else:
-        async with SessionLocal() as s:
-            db_user = (
-                await s.execute(select(User).where(User.tg_id == tg_id))
-            ).scalars().first()
-            if db_user:
-                db_user.language = lang
-                await s.commit()
+    lang = callback_data.lang
+    # Callback data comes from the client - never store an unknown language
+    if lang not in SUPPORTED_LANGS:
+        await c.answer()
+        return
 
+    user_id, current = await get_user_cached(tg_id)
     is_admin = tg_id in settings.ADMIN_IDS
+    reply = c.message.edit_text(start_text(lang), reply_markup=main_menu_cached(lang, is_admin=is_admin))
 
-    await c.message.edit_text(
-        t(lang, "start_message", name=c.from_user.full_name) + "\n\n" +
-        t(lang, "start_menu"),
-        reply_markup=main_menu(_lang(lang), is_admin=is_admin)      # <-- DÜZƏLDİLDİ
+    # Re-picking the current language: nothing to write, just show the menu
+    if user_id is not None and current == lang:
+        await reply
+        await c.answer()
+        return
+
+    # The reply doesn't depend on the write - run both round-trips together
+    # (the upsert has no SELECT-then-INSERT race for concurrent taps)
+    user_id, _ = await asyncio.gather(
+        _save_user_lang(tg_id, lang),
+        reply,
     )
+
+    # Written just now - cache it instead of dropping the entry and re-reading it
+    remember_user(tg_id, user_id, lang)
     await c.answer()
 
 
@@ -126,7 +121,7 @@ async def on_set_lang(c: CallbackQuery):
 # -----------------------------
 @router.message(Command("help"))
 async def on_help(m: Message):
-    lang = await _user_lang(m.from_user.id)
+    lang = await get_user_lang(m.from_user.id)
     await m.answer(t(lang, "help_text"))
 
 
@@ -135,10 +130,10 @@ async def on_help(m: Message):
 # -----------------------------
 @router.message(Command("lang"))
 async def on_lang_command(m: Message):
-    lang = await _user_lang(m.from_user.id)
+    lang = await get_user_lang(m.from_user.id)
     await m.answer(
         t(lang, "set_language"),
-        reply_markup=language_keyboard()
+        reply_markup=LANGUAGE_KEYBOARD
     )
 
 
@@ -147,10 +142,10 @@ async def on_lang_command(m: Message):
 # -----------------------------
 @router.callback_query(F.data == "menu:lang")
 async def on_lang_menu(c: CallbackQuery):
-    lang = await _user_lang(c.from_user.id)
+    lang = await get_user_lang(c.from_user.id)
     await c.message.edit_text(
         t(lang, "set_language"),
-        reply_markup=language_keyboard()
+        reply_markup=LANGUAGE_KEYBOARD
     )
     await c.answer()
 
@@ -160,6 +155,6 @@ async def on_lang_menu(c: CallbackQuery):
 # -----------------------------
 @router.callback_query(F.data == "menu:search")
 async def on_menu_search(c: CallbackQuery):
-    lang = await _user_lang(c.from_user.id)
+    lang = await get_user_lang(c.from_user.id)
     await c.message.edit_text(t(lang, "prompt_search"))
     await c.answer()
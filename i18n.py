@@ -1,38 +1,76 @@
 import orjson
 from pathlib import Path
 from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping
 
-LOCALES_DIR = Path("./locales")
+LOCALES_DIR = Path("./locales").resolve()
 DEFAULT_LANG = "az"
+# Languages offered in the language picker (locales/<lang>.json), in display order
+LANG_FLAGS = {"az": "🇦🇿", "en": "🇬🇧", "ru": "🇷🇺"}
+LANG_NAMES = {"az": "Azərbaycan dili", "en": "English", "ru": "Русский"}
+SUPPORTED_LANGS = frozenset(LANG_NAMES)
+
+
+def _scan_locales() -> dict[str, Path]:
+    """lang code -> locale file, from one directory listing."""
+    return {file.stem: file for file in LOCALES_DIR.glob("*.json")}
+
+
+# Scanned once; reload_locales() rescans, so no exists() check per cold load
+_FILES = _scan_locales()
+
+
+def _flatten(data: dict, prefix: str = "", out: dict | None = None) -> dict:
+    """{"recognition": {"processing": ...}} -> {"recognition.processing": ...}"""
+    if out is None:
+        out = {}
+    for k, v in data.items():
+        path = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            _flatten(v, path, out)
+        else:
+            out[path] = v
+    return out
+
+
+_EMPTY: Mapping[str, object] = MappingProxyType({})
 
 
 @lru_cache(maxsize=16)
-def _load(lang: str) -> dict:
+def _load(lang: str) -> Mapping[str, object]:
+    """
+    Locale dict with nested keys pre-flattened to dotted ones.
+    Returned read-only — it is shared by every caller through the cache.
+    """
     lang = (lang or DEFAULT_LANG).lower()
-    file = LOCALES_DIR / f"{lang}.json"
-
-    if not file.exists():
-        file = LOCALES_DIR / f"{DEFAULT_LANG}.json"
+    file = _FILES.get(lang) or _FILES.get(DEFAULT_LANG)
+    if file is None:
+        return _EMPTY
 
     try:
-        return orjson.loads(file.read_bytes())
+        return MappingProxyType(_flatten(orjson.loads(file.read_bytes())))
     except Exception:
-        return {}
+        return _EMPTY
+
+
+def warm_locales() -> None:
+    """Load every locales/*.json up front so no request pays for a cold load."""
+    for lang in _FILES:
+        _load(lang)
+
+
+def reload_locales() -> None:
+    """Drop the memoized locale dicts so edited (or added) JSON files are picked up."""
+    global _FILES
+    _FILES = _scan_locales()
+    _load.cache_clear()
+    warm_locales()
 
 
 def t(lang: str, key: str, **kwargs) -> str:
-    data = _load(lang)
-    
-    # Support nested keys like "recognition.processing"
-    keys = key.split(".")
-    text = data
-    for k in keys:
-        if isinstance(text, dict):
-            text = text.get(k, key)
-        else:
-            text = key
-            break
-    
+    # Nested keys like "recognition.processing" are flattened at load time
+    text = _load(lang).get(key, key)
     if not isinstance(text, str):
         text = key
 
@@ -1,31 +1,74 @@
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from i18n import t
+from functools import lru_cache
+from i18n import _load, SUPPORTED_LANGS
+
+
+# -----------------------------------------------------------
+# 🔖 Callback data — aiogram bir dəfə parse edir
+# -----------------------------------------------------------
+class SongCallback(CallbackData, prefix="song"):
+    """song:<action>:<yt_id> — action: dl, ly, tr, fav, pl, fx"""
+    action: str
+    yt_id: str
+
+
+class FxCallback(CallbackData, prefix="fx"):
+    """fx:<kind>:<value>:<yt_id>"""
+    kind: str
+    value: str
+    yt_id: str
+
+
+class SearchCallback(CallbackData, prefix="search"):
+    """search:select:<yt_id>"""
+    action: str
+    yt_id: str
+
+
+class LangCallback(CallbackData, prefix="setlang"):
+    """setlang:<lang>"""
+    lang: str
+
+
+class FavOpenCallback(CallbackData, prefix="favopen"):
+    """favopen:<yt_id>"""
+    yt_id: str
+
+
+class PlaylistCallback(CallbackData, prefix="pl"):
+    """pl:<action>:<playlist_id>:<yt_id> — action: add, new (new üçün playlist_id boşdur)"""
+    action: str
+    playlist_id: int | None = None
+    yt_id: str
 
 
 # -----------------------------------------------------------
 # 🌍 Əsas menyu
 # -----------------------------------------------------------
-def main_menu(lang_texts: dict, is_admin: bool = False):
+def main_menu(lang: str, is_admin: bool = False):
     """
     Əsas menyu — çoxdilli, playlist yoxdur.
+    lang: dil kodu (az, en, ru)
     """
+    get = _load(lang).get
     kb = InlineKeyboardBuilder()
 
     kb.row(
         InlineKeyboardButton(
-            text=lang_texts.get("btn_search", "🔍 Axtarış"),
+            text=get("btn_search", "🔍 Axtarış"),
             callback_data="menu:search"
         ),
         InlineKeyboardButton(
-            text=lang_texts.get("btn_favorites", "⭐ Sevimlilər"),
+            text=get("btn_favorites", "⭐ Sevimlilər"),
             callback_data="menu:favorites"
         )
     )
 
     kb.row(
         InlineKeyboardButton(
-            text=lang_texts.get("btn_lang", "🌍 Dil"),
+            text=get("btn_lang", "🌍 Dil"),
             callback_data="menu:lang"
         )
     )
@@ -33,7 +76,7 @@ def main_menu(lang_texts: dict, is_admin: bool = False):
     if is_admin:
         kb.row(
             InlineKeyboardButton(
-                text=lang_texts.get("btn_admin", "⚙️ Admin Panel"),
+                text=get("btn_admin", "⚙️ Admin Panel"),
                 callback_data="menu:admin"
             )
         )
@@ -41,80 +84,134 @@ def main_menu(lang_texts: dict, is_admin: bool = False):
     return kb.as_markup()
 
 
+@lru_cache(maxsize=16)
+def main_menu_cached(lang: str, is_admin: bool = False):
+    """
+    main_menu() dil kodu + admin bayrağı üzrə yaddaşda saxlanılır.
+    Nəticə paylaşılır — dəyişdirməyin.
+    """
+    return main_menu(lang, is_admin=is_admin)
+
+
+def warm_keyboards() -> None:
+    """
+    Bütün dillər üçün əsas menyunu əvvəlcədən qurur — ilk /start da hazır markup alır.
+    effects_menu və song_actions yt_id-dən asılıdır, onlar ilk istifadədə keşlənir.
+    """
+    for lang in SUPPORTED_LANGS:
+        main_menu_cached(lang, is_admin=False)
+        main_menu_cached(lang, is_admin=True)
+
+
+def reset_keyboards() -> None:
+    """
+    Keşlənmiş bütün klaviaturaları atır və əsas menyunu yenidən qurur.
+    Dil faylları yenidən yükləndikdən sonra çağırılır (/reloadlocales).
+    """
+    main_menu_cached.cache_clear()
+    song_actions_cached.cache_clear()
+    effects_menu_cached.cache_clear()
+    _effects_labels.cache_clear()
+    _song_template.cache_clear()
+    warm_keyboards()
+
+
 # -----------------------------------------------------------
 # 🎵 Mahnı əməliyyatları
 # -----------------------------------------------------------
-def song_actions(lang_texts: dict, yt_id: str):
+# (dil açarı, default mətn, SongCallback action) — sıralar düymə sıralarıdır
+_SONG_BUTTONS = (
+    (("download", "⬇️ Yüklə", "dl"), ("lyrics", "📝 Sözlər", "ly")),
+    (("translate", "🇦🇿 Tərcümə et", "tr"),),
+    (("favorite", "⭐ Favoritə əlavə et", "fav"),),
+    (("btn.add_to_playlist", "➕ Playlist", "pl"),),
+    (("effects", "🎚️ Effektlər", "fx"),),
+)
+
+
+@lru_cache(maxsize=16)
+def _song_template(lang: str) -> tuple:
+    """
+    song_actions şablonu — dil başına bir dəfə.
+    Sıralar: ((mətn, "song:<action>:"), ...) — yt_id sonradan sadəcə əlavə olunur.
+    """
+    get = _load(lang).get
+    return tuple(
+        tuple(
+            (get(key, default), SongCallback(action=action, yt_id="").pack())
+            for key, default, action in row
+        )
+        for row in _SONG_BUTTONS
+    )
+
+
+def song_actions(lang: str, yt_id: str):
     """
     Mahnı əməliyyatları üçün düymələr.
+    lang: dil kodu (az, en, ru)
+    SongCallback.pack() əvəzinə hazır prefiks + yt_id — hər düymə üçün model yaradılmır.
     """
     return InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(
-                text=lang_texts.get("download", "⬇️ Yüklə"),
-                callback_data=f"song:dl:{yt_id}"
-            ),
-            InlineKeyboardButton(
-                text=lang_texts.get("lyrics", "📝 Sözlər"),
-                callback_data=f"song:ly:{yt_id}"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text=lang_texts.get("translate", "🇦🇿 Tərcümə et"),
-                callback_data=f"song:tr:{yt_id}"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text=lang_texts.get("favorite", "⭐ Favoritə əlavə et"),
-                callback_data=f"song:fav:{yt_id}"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text=lang_texts.get("btn.add_to_playlist", "➕ Playlist"),
-                callback_data=f"song:pl:{yt_id}"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text=lang_texts.get("effects", "🎚️ Effektlər"),
-                callback_data=f"song:fx:{yt_id}"
-            )
-        ]
+        [InlineKeyboardButton(text=text, callback_data=prefix + yt_id) for text, prefix in row]
+        for row in _song_template(lang)
     ])
 
 
+@lru_cache(maxsize=2048)
+def song_actions_cached(lang: str, yt_id: str):
+    """
+    song_actions() dil kodu + yt_id üzrə yaddaşda saxlanılır.
+    Nəticə paylaşılır — dəyişdirməyin.
+    """
+    return song_actions(lang, yt_id)
+
+
 # -----------------------------------------------------------
 # 🎚️ Effekt menyusu
 # -----------------------------------------------------------
-def effects_menu(lang_texts: dict | None = None, yt_id: str | None = None):
+# (dil açarı, default mətn, effekt növü, dəyər) — hər sırada 2 düymə
+_EFFECT_BUTTONS = (
+    (("bass_plus6", "Bass +6dB", "bass", "6"), ("treble_plus4", "Treble +4dB", "treble", "4")),
+    (("reverb", "Reverb", "reverb", "1"), ("echo", "Echo", "echo", "1")),
+    (("pitch_up", "Pitch +2", "pitch", "2"), ("pitch_down", "Pitch -2", "pitch", "-2")),
+    (("speed_up", "Speed 1.25x", "speed", "1.25"), ("speed_down", "Speed 0.9x", "speed", "0.9")),
+)
+
+
+@lru_cache(maxsize=16)
+def _effects_labels(lang: str) -> tuple:
+    """
+    Effekt düymələrinin tərcümə olunmuş mətnləri — dil başına bir dəfə.
+    Sıralar: ((mətn, növ, dəyər), ...)
+    """
+    get = _load(lang).get
+    return tuple(
+        tuple((get(key, default), kind, value) for key, default, kind, value in row)
+        for row in _EFFECT_BUTTONS
+    )
+
+
+def effects_menu(lang: str, yt_id: str):
     """
     Effekt seçimləri — çoxdilli.
-    yt_id: YouTube video ID to include in callback data
+    Mətnlər dil üzrə hazırdır, yalnız callback_data yt_id ilə qurulur.
     """
-    kb = InlineKeyboardBuilder()
-    get = (lang_texts or {}).get
-    
-    # Include yt_id in callback data if provided
-    suffix = f":{yt_id}" if yt_id else ""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text=text,
+                callback_data=FxCallback(kind=kind, value=value, yt_id=yt_id).pack(),
+            )
+            for text, kind, value in row
+        ]
+        for row in _effects_labels(lang)
+    ])
 
-    kb.row(
-        InlineKeyboardButton(text=get("bass_plus6", "Bass +6dB"), callback_data=f"fx:bass:6{suffix}"),
-        InlineKeyboardButton(text=get("treble_plus4", "Treble +4dB"), callback_data=f"fx:treble:4{suffix}")
-    )
-    kb.row(
-        InlineKeyboardButton(text=get("reverb", "Reverb"), callback_data=f"fx:reverb:1{suffix}"),
-        InlineKeyboardButton(text=get("echo", "Echo"), callback_data=f"fx:echo:1{suffix}")
-    )
-    kb.row(
-        InlineKeyboardButton(text=get("pitch_up", "Pitch +2"), callback_data=f"fx:pitch:2{suffix}"),
-        InlineKeyboardButton(text=get("pitch_down", "Pitch -2"), callback_data=f"fx:pitch:-2{suffix}")
-    )
-    kb.row(
-        InlineKeyboardButton(text=get("speed_up", "Speed 1.25x"), callback_data=f"fx:speed:1.25{suffix}"),
-        InlineKeyboardButton(text=get("speed_down", "Speed 0.9x"), callback_data=f"fx:speed:0.9{suffix}")
-    )
 
-    return kb.as_markup()
+@lru_cache(maxsize=2048)
+def effects_menu_cached(lang: str, yt_id: str):
+    """
+    effects_menu() dil kodu + yt_id üzrə yaddaşda saxlanılır.
+    Nəticə paylaşılır — dəyişdirməyin.
+    """
+    return effects_menu(lang, yt_id)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Boolean, ForeignKey, DateTime, Text, UniqueConstraint
+from sqlalchemy import String, Integer, BigInteger, Boolean, ForeignKey, DateTime, Text, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from datetime import datetime
 from db import Base
@@ -8,7 +8,8 @@ from db import Base
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(primary_key=True)
-    tg_id: Mapped[int] = mapped_column(Integer, unique=True, index=True)
+    # Telegram ids no longer fit in 32 bits
+    tg_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
     language: Mapped[str] = mapped_column(String(5), default="az")
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)
     is_banned: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -34,6 +35,11 @@ class Song(Base):
     mood: Mapped[str] = mapped_column(String(50), default="")
 
 
+# "Last played" fallback in effects and the admin top-songs list sort on these
+Index("ix_songs_last_played", Song.last_played.desc())
+Index("ix_songs_play_count", Song.play_count.desc())
+
+
 class Favorite(Base):
     __tablename__ = "favorites"
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -72,3 +78,20 @@ class RequestLog(Base):
     via_voice: Mapped[bool] = mapped_column(Boolean, default=False)
     matched_song_id: Mapped[int | None] = mapped_column(ForeignKey("songs.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class QueryCache(Base):
+    """Normalized search text -> the YouTube video it resolved to, kept across restarts."""
+    __tablename__ = "query_cache"
+    normalized_query: Mapped[str] = mapped_column(Text, primary_key=True)
+    youtube_id: Mapped[str] = mapped_column(String(32))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class SocialVideo(Base):
+    """TikTok/Instagram video -> the song it was matched to, so repeat links skip the download."""
+    __tablename__ = "social_videos"
+    platform: Mapped[str] = mapped_column(String(16), primary_key=True)
+    video_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    song_id: Mapped[int] = mapped_column(ForeignKey("songs.id"))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -1,16 +1,24 @@
+import asyncio
+import logging
 import subprocess
 import os
 import uuid
 import time
 from typing import Dict, Optional
 from utils.common import ensure_ffmpeg
+from utils.audio_tools import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# A whole song is re-encoded, so allow more than the default ffmpeg timeout
+EFFECT_TIMEOUT = 300
 
 FFMPEG_PATH = r"C:\Users\user\OneDrive\Desktop\LyricaBot\ffmpeg-8.0-essentials_build\bin\ffmpeg.exe"
 
 if os.path.exists(FFMPEG_PATH):
     os.environ["PATH"] += os.pathsep + os.path.dirname(FFMPEG_PATH)
 else:
-    print("⚠️ FFmpeg tapılmadı, sistem PATH istifadə olunacaq.")
+    logger.warning("⚠️ FFmpeg tapılmadı, sistem PATH istifadə olunacaq.")
 
 
 def build_filter(effects: Dict) -> str:
@@ -59,10 +67,10 @@ def cleanup_old_fx_files(base_dir: str):
                     pass
 
 
-def apply_effects(input_path: str, output_path: Optional[str], effects: Dict) -> str:
+async def apply_effects(input_path: str, output_path: Optional[str], effects: Dict) -> str:
     ensure_ffmpeg()
     base_dir = os.path.dirname(input_path)
-    cleanup_old_fx_files(base_dir)
+    await asyncio.to_thread(cleanup_old_fx_files, base_dir)
 
     filter_chain = build_filter(effects)
 
@@ -83,9 +91,13 @@ def apply_effects(input_path: str, output_path: Optional[str], effects: Dict) ->
     cmd += ["-vn", "-codec:a", "libmp3lame", "-q:a", "4", output_path]
 
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Shares the ffmpeg process limit with the recognition/voice pipelines
+        await run_ffmpeg(cmd, timeout=EFFECT_TIMEOUT)
     except subprocess.CalledProcessError as e:
-        print(f"❌ FFmpeg error: {e}")
+        logger.error(f"❌ FFmpeg error: {e}")
+        return input_path
+    except asyncio.TimeoutError:
+        logger.error(f"❌ FFmpeg timed out rendering effects for {input_path}")
         return input_path
 
     return output_path
@@ -3,60 +3,99 @@ Smart Cache Service (RAM-based)
 Provides in-memory caching with TTL, hit/miss tracking for lyrics & translations.
 """
 
+import hashlib
 import time
-from typing import Optional, Tuple
+from typing import Any, Optional
 from config import settings
 
 
 class SmartCache:
     """
-    In-memory cache with TTL and hit/miss statistics.
+    In-memory cache with TTL, LRU eviction (max_size) and hit/miss statistics.
+    Event-loop only; not thread-safe.
     """
 
-    def __init__(self, default_ttl_seconds: int = 3600):
-        self._cache: dict[str, Tuple[float, any]] = {}  # key -> (expires_at, value)
+    # Expired entries are swept in one pass every SWEEP_EVERY sets
+    SWEEP_EVERY = 1024
+
+    def __init__(self, default_ttl_seconds: int = 3600, max_size: Optional[int] = None):
+        self._expires: dict[str, float] = {}  # key -> expires_at
+        self._values: dict[str, Any] = {}  # key -> value
         self._hits: int = 0
         self._misses: int = 0
         self.default_ttl = default_ttl_seconds
+        self.max_size = max_size
+        self._sets_since_sweep: int = 0
 
-    def get(self, key: str) -> Optional[any]:
+    def get(self, key: str) -> Optional[Any]:
         """
         Get value from cache if not expired.
         Returns None on miss or expiration.
         """
-        if key not in self._cache:
+        expires_at = self._expires.get(key)
+        if expires_at is None:
             self._misses += 1
             return None
 
-        expires_at, value = self._cache[key]
-        if time.time() > expires_at:
+        if time.monotonic() > expires_at:
             # Expired
-            del self._cache[key]
+            del self._expires[key]
+            del self._values[key]
             self._misses += 1
             return None
 
+        if self.max_size:
+            # Move to the end of the eviction order - most recently used
+            self._expires[key] = self._expires.pop(key)
         self._hits += 1
-        return value
+        return self._values[key]
 
-    def set(self, key: str, value: any, ttl: Optional[int] = None) -> None:
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """
         Store value in cache with given TTL (seconds).
         If ttl is None, uses default_ttl.
         """
         ttl_to_use = ttl if ttl is not None else self.default_ttl
-        expires_at = time.time() + ttl_to_use
-        self._cache[key] = (expires_at, value)
+        self._sets_since_sweep += 1
+        if self._sets_since_sweep >= self.SWEEP_EVERY:
+            self._sweep_expired()
+        if self.max_size:
+            if key in self._expires:
+                # Re-set counts as a use - reinsert at the end
+                del self._expires[key]
+            elif len(self._expires) >= self.max_size:
+                # dicts keep insertion order - the first key is the least recently used
+                oldest = next(iter(self._expires))
+                del self._expires[oldest]
+                del self._values[oldest]
+        self._expires[key] = time.monotonic() + ttl_to_use
+        self._values[key] = value
+
+    def _sweep_expired(self) -> None:
+        """Drop every expired entry in one pass."""
+        self._sets_since_sweep = 0
+        now = time.monotonic()
+        expired = [key for key, expires_at in self._expires.items() if expires_at < now]
+        for key in expired:
+            del self._expires[key]
+            del self._values[key]
+
+    def delete(self, key: str) -> None:
+        """Remove a single entry if present."""
+        self._expires.pop(key, None)
+        self._values.pop(key, None)
 
     def clear(self) -> None:
         """Clear all cache entries."""
-        self._cache.clear()
+        self._expires.clear()
+        self._values.clear()
 
     def stats(self) -> dict:
         """Return current statistics."""
         return {
             "hits": self._hits,
             "misses": self._misses,
-            "size": len(self._cache),
+            "size": len(self._values),
         }
 
 
@@ -65,10 +104,28 @@ class SmartCache:
 # ========================================================
 
 # Lyrics cache: keyed by title+artist
-lyrics_cache = SmartCache(default_ttl_seconds=settings.CACHE_EXPIRATION_MINUTES * 60)
+lyrics_cache = SmartCache(default_ttl_seconds=settings.CACHE_EXPIRATION_MINUTES * 60, max_size=2000)
 
 # Translation cache: keyed by song_id+target_lang
-translation_cache = SmartCache(default_ttl_seconds=settings.CACHE_EXPIRATION_MINUTES * 60)
+translation_cache = SmartCache(default_ttl_seconds=settings.CACHE_EXPIRATION_MINUTES * 60, max_size=2000)
+
+# User cache: keyed by tg_id, value is (users.id or None, language)
+user_cache = SmartCache(default_ttl_seconds=300, max_size=10_000)
+
+# Lyrics per song: keyed by yt_id, lets on_lyrics skip the DB and the fetch
+song_lyrics_cache = SmartCache(default_ttl_seconds=24 * 3600, max_size=10_000)
+
+# Search results: keyed by normalized query text
+search_cache = SmartCache(default_ttl_seconds=3600, max_size=512)
+
+# Lyrics opened by a user, kept for the translate button: keyed by tg_id+yt_id
+user_lyrics_cache = SmartCache(default_ttl_seconds=3600, max_size=5000)
+
+# Recognition results: keyed by a hash of the audio bytes (forwarded clips hit this)
+recognition_cache = SmartCache(default_ttl_seconds=24 * 3600, max_size=1024)
+
+# search_and_download results: keyed by normalized query text
+yt_download_cache = SmartCache(default_ttl_seconds=3600, max_size=512)
 
 
 # ========================================================
@@ -85,6 +142,48 @@ def translation_key(song_id: int, target_lang: str) -> str:
     return f"lyrics:{song_id}:{target_lang.lower()}"
 
 
+def text_translation_key(text: str, target_lang: str) -> str:
+    """Generate cache key for a translation of arbitrary text (hashed, not stored)."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+    return f"translation:{digest}:{target_lang.lower()}"
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a search query."""
+    return " ".join(query.casefold().split())
+
+
+def search_key(query: str) -> str:
+    """Generate cache key for search results."""
+    return f"search:{normalize_query(query)}"
+
+
+def user_key(tg_id: int) -> str:
+    """Generate cache key for a user's id and interface language."""
+    return f"user:{tg_id}"
+
+
+def song_lyrics_key(yt_id: str) -> str:
+    """Generate cache key for the lyrics of a stored song."""
+    return f"song_lyrics:{yt_id}"
+
+
+def user_lyrics_key(tg_id: int, yt_id: str) -> str:
+    """Generate cache key for the lyrics a user last opened for a song."""
+    return f"user_lyrics:{tg_id}:{yt_id}"
+
+
+def recognition_key(audio_data: bytes, mode: str) -> str:
+    """Generate cache key for a recognition result (audio is hashed, not stored)."""
+    digest = hashlib.blake2b(audio_data, digest_size=16).hexdigest()
+    return f"recognition:{digest}:{mode}"
+
+
+def yt_download_key(query: str) -> str:
+    """Generate cache key for a search_and_download result."""
+    return f"yt_download:{normalize_query(query)}"
+
+
 def get_cache_stats() -> dict:
     """
     Aggregate statistics from all cache instances.
@@ -1,8 +1,20 @@
+import asyncio
 import httpx
 import re
 from typing import Optional
 
 from services.cache import lyrics_cache, lyrics_key
+from utils.single_flight import single_flight
+
+# Regexlər bir dəfə, modul yüklənəndə kompilyasiya olunur
+_PAREN_RE = re.compile(r"\(.*?\)")
+_BRACKET_RE = re.compile(r"\[.*?\]")
+_TITLE_JUNK_RE = re.compile(r"Official|Video|Music|HD|4K|Audio|Clip", re.I)
+_WS_RE = re.compile(r"\s+")
+_HTML_TAG_RE = re.compile(r"<.*?>")
+_XML_TAG_RE = re.compile(r"</?[^>]+>")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_MULTI_SPACE_RE = re.compile(r"\s{2,}")
 
 
 # =====================================================
@@ -10,11 +22,11 @@ from services.cache import lyrics_cache, lyrics_key
 # =====================================================
 def clean_title(title: str) -> str:
     # Remove brackets (Official Video), (4K), [Lyrics], etc.
-    title = re.sub(r"\(.*?\)", "", title)
-    title = re.sub(r"\[.*?\]", "", title)
-    title = re.sub(r"Official|Video|Music|HD|4K|Audio|Clip", "", title, flags=re.I)
-    title = re.sub(r"–|-", "-", title)
-    title = re.sub(r"\s+", " ", title)
+    title = _PAREN_RE.sub("", title)
+    title = _BRACKET_RE.sub("", title)
+    title = _TITLE_JUNK_RE.sub("", title)
+    title = title.replace("–", "-")
+    title = _WS_RE.sub(" ", title)
     return title.strip()
 
 
@@ -24,6 +36,7 @@ async def get_lyrics(title: str, artist: str = "") -> Optional[str]:
     SmartCache istifadə edir:
     - Açar: lyrics:{title}:{artist}
     - TTL: settings.CACHE_EXPIRATION_MINUTES əsasında.
+    Eyni mahnı üçün paralel sorğular bir şəbəkə axtarışını gözləyir.
     """
     original_title = title
     title = clean_title(title)  # 🔥 Təmizlənmiş ad
@@ -33,8 +46,18 @@ async def get_lyrics(title: str, artist: str = "") -> Optional[str]:
     if cached is not None:
         return cached
 
+    async def _fetch() -> Optional[str]:
+        lyrics = await _fetch_lyrics(title, original_title, artist)
+        if lyrics:
+            lyrics_cache.set(key, lyrics)
+        return lyrics
+
+    # Bir açar üçün yalnız bir aktiv axtarış
+    return await single_flight(key, _fetch)
+
+
+async def _fetch_lyrics(title: str, original_title: str, artist: str) -> Optional[str]:
     # Paralel fetch - daha sürətli
-    import asyncio
     try:
         lrclib_task = asyncio.create_task(_lrclib_search(title, artist))
         youtube_task = asyncio.create_task(_youtube_captions(original_title))
@@ -59,7 +82,6 @@ async def get_lyrics(title: str, artist: str = "") -> Optional[str]:
             try:
                 lyrics = await task
                 if lyrics:
-                    lyrics_cache.set(key, lyrics)
                     return lyrics
             except Exception:
                 pass
@@ -71,15 +93,9 @@ async def get_lyrics(title: str, artist: str = "") -> Optional[str]:
     # Fallback - tək-tək yoxla
     lyrics = await _lrclib_search(title, artist)
     if lyrics:
-        lyrics_cache.set(key, lyrics)
         return lyrics
 
-    lyrics = await _youtube_captions(original_title)
-    if lyrics:
-        lyrics_cache.set(key, lyrics)
-        return lyrics
-
-    return None
+    return await _youtube_captions(original_title)
 
 
 # =====================================================
@@ -156,16 +172,16 @@ async def _youtube_captions(title: str) -> Optional[str]:
 # 🔧 CLEANERS
 # =====================================================
 def _clean(text: str) -> str:
-    text = re.sub(r"<.*?>", "", text)
+    text = _HTML_TAG_RE.sub("", text)
     text = text.replace("&amp;", "&")
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
     return text.strip()
 
 
 def _clean_xml(text: str) -> str:
-    text = re.sub(r"</?[^>]+>", "", text)
+    text = _XML_TAG_RE.sub("", text)
     text = text.replace("&amp;", "&")
     text = text.replace("&#39;", "'")
     text = text.replace("&quot;", '"')
-    text = re.sub(r"\s{2,}", " ", text)
+    text = _MULTI_SPACE_RE.sub(" ", text)
     return text.strip()
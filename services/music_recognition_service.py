@@ -3,17 +3,24 @@ Music Recognition Service
 Unified interface for music recognition from various sources.
 """
 import os
-import tempfile
 import asyncio
 import logging
 import re
-import hashlib
 from typing import Optional, Literal, Dict, Any
 from dataclasses import dataclass
 import httpx
 
+from services.cache import recognition_cache, recognition_key
+
 logger = logging.getLogger(__name__)
 
+# MIME types for containers the recognition backends accept as-is
+_AUDIO_MIME_TYPES = {
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+    "mp3": "audio/mpeg",
+}
+
 
 @dataclass
 class RecognitionResult:
@@ -41,8 +48,6 @@ class MusicRecognitionService:
         self.audd_api_token = os.getenv("AUDD_API_TOKEN", "") or getattr(
             settings, "AUDD_API_TOKEN", ""
         )
-        self._cache: Dict[str, RecognitionResult] = {}
-        self._lock = asyncio.Lock()
 
         if self.audd_api_token:
             logger.info("✅ AudD API token loaded")
@@ -51,42 +56,60 @@ class MusicRecognitionService:
                 "⚠️ AudD API token not found - recognition may not work"
             )
 
-    def _get_file_hash(self, file_path: str) -> str:
-        """Generate a hash of the file for caching"""
-        h = hashlib.md5()
+    def _read_file(self, file_path: str) -> bytes:
+        """Read a whole audio file synchronously (called via to_thread)."""
         with open(file_path, "rb") as f:
-            while chunk := f.read(8192):
-                h.update(chunk)
-        return h.hexdigest()
+            return f.read()
 
     async def recognize_from_file(
         self,
         file_path: str,
         mode: Literal["default", "humming"] = "default",
         video_info: Optional[Dict[str, Any]] = None,
+        format_hint: Optional[str] = None,
     ) -> Optional[RecognitionResult]:
-        """Recognize music from an audio file with caching and fallback."""
+        """Recognize music from an audio file with caching and fallback.
+
+        format_hint: container of the file ("wav", "ogg", "mp3"); inferred from
+        the extension when omitted. The file is uploaded as-is, no re-encode.
+        """
         if not os.path.exists(file_path):
             logger.error(f"File not found: {file_path}")
             return None
 
-        # Try cache first
-        file_hash = self._get_file_hash(file_path)
-        cache_key = f"{file_hash}_{mode}"
+        if format_hint is None:
+            format_hint = os.path.splitext(file_path)[1].lstrip(".").lower()
 
-        async with self._lock:
-            if cache_key in self._cache:
-                logger.debug("Cache hit for audio file")
-                return self._cache[cache_key]
+        # Read once - the same bytes are hashed for the cache and uploaded
+        audio_data = await asyncio.to_thread(self._read_file, file_path)
+        return await self.recognize_from_bytes(audio_data, mode, video_info, format_hint)
+
+    async def recognize_from_bytes(
+        self,
+        audio_data: bytes,
+        mode: Literal["default", "humming"] = "default",
+        video_info: Optional[Dict[str, Any]] = None,
+        format_hint: str = "mp3",
+    ) -> Optional[RecognitionResult]:
+        """Recognize music from in-memory audio with caching and fallback.
+
+        The bytes are uploaded directly, no temp file is written.
+        """
+        # Try cache first - repeated forwards of the same clip skip the API
+        cache_key = recognition_key(audio_data, mode)
+        cached = recognition_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Cache hit for audio file")
+            return cached
 
         # Try AudD first
         result: Optional[RecognitionResult] = None
         if self.audd_api_token:
-            result = await self._recognize_audd(file_path, mode)
+            result = await self._recognize_audd(audio_data, mode, format_hint)
 
         # Fallback to ACRCloud if enabled (placeholder)
         if not result and self.acrcloud_api_key and self.acrcloud_secret:
-            result = await self._recognize_acrcloud(file_path, mode)
+            result = await self._recognize_acrcloud(audio_data, mode)
 
         # Final fallback to video metadata
         if not result and video_info:
@@ -96,28 +119,10 @@ class MusicRecognitionService:
 
         # Cache the result
         if result:
-            async with self._lock:
-                self._cache[cache_key] = result
+            recognition_cache.set(cache_key, result)
 
         return result
 
-    async def recognize_from_bytes(
-        self,
-        audio_data: bytes,
-        mode: Literal["default", "humming"] = "default",
-        video_info: Optional[Dict[str, Any]] = None,
-    ) -> Optional[RecognitionResult]:
-        """Recognize music from audio bytes with temp file handling."""
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-            tmp.write(audio_data)
-            tmp_path = tmp.name
-
-        try:
-            return await self.recognize_from_file(tmp_path, mode, video_info)
-        finally:
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-
     def _get_metadata_fallback(
         self, video_info: Dict[str, Any]
     ) -> Optional[RecognitionResult]:
@@ -200,20 +205,17 @@ class MusicRecognitionService:
 
     async def _recognize_audd(
         self,
-        file_path: str,
+        audio_data: bytes,
         mode: str,
+        format_hint: str = "wav",
     ) -> Optional[RecognitionResult]:
         """Recognize using AudD.io API with multipart/form-data (correct fix)."""
         if not self.audd_api_token:
             logger.error("❌ No AudD token found")
             return None
 
-        if not os.path.exists(file_path):
-            logger.error(f"AudD: file not found: {file_path}")
-            return None
-
         try:
-            file_name = os.path.basename(file_path)
+            file_name = f"audio.{format_hint}"
             logger.info(f"🎧 Sending audio to AudD (multipart): {file_name}")
 
             data = {
@@ -224,22 +226,20 @@ class MusicRecognitionService:
             if mode == "humming":
                 data["method"] = "recognize_with_offset"
 
+            files = {
+                "file": (
+                    file_name,   # filename
+                    audio_data,  # binary data
+                    _AUDIO_MIME_TYPES.get(format_hint, "audio/wav"),  # MIME type
+                )
+            }
+
             async with httpx.AsyncClient(timeout=30.0) as client:
-                # open file inside context so it's open while request is sent
-                with open(file_path, "rb") as f:
-                    files = {
-                        "file": (
-                            file_name,  # filename
-                            f,          # binary data
-                            "audio/wav" # MIME type
-                        )
-                    }
-
-                    response = await client.post(
-                        "https://api.audd.io/",
-                        data=data,
-                        files=files,
-                    )
+                response = await client.post(
+                    "https://api.audd.io/",
+                    data=data,
+                    files=files,
+                )
 
             response.raise_for_status()
             result = response.json()
@@ -292,14 +292,9 @@ class MusicRecognitionService:
             logger.error(f"❌ AudD recognition exception: {e}", exc_info=True)
             return None
 
-    def _read_file_chunk(self, file_path: str, size: int) -> bytes:
-        """Helper to read a chunk of a file synchronously."""
-        with open(file_path, "rb") as f:
-            return f.read(size)
-
     async def _recognize_acrcloud(
         self,
-        file_path: str,
+        audio_data: bytes,
         mode: str,
     ) -> Optional[RecognitionResult]:
         """ACRCloud recognition placeholder."""
@@ -0,0 +1,112 @@
+"""
+Request Log Service
+Buffers RequestLog rows in memory and writes them to the DB in batches,
+so handlers never wait on an analytics commit.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import select, insert
+
+from db import SessionLocal
+from models import User, RequestLog
+
+logger = logging.getLogger(__name__)
+
+# Max rows written per commit
+BATCH_SIZE = 256
+
+# Max seconds the writer waits for a batch to fill up
+FLUSH_INTERVAL = 1.0
+
+# (tg_id, query, via_voice, matched_song_id) — tg_id is resolved to users.id in the writer
+_Entry = tuple[int, str, bool, Optional[int]]
+_log_queue: asyncio.Queue[_Entry] = asyncio.Queue(maxsize=10_000)
+
+
+def queue_request_log(
+    tg_id: int,
+    query: str,
+    via_voice: bool = False,
+    matched_song_id: Optional[int] = None,
+) -> None:
+    """
+    Queue a request log entry without touching the DB.
+    Entries are dropped (with a warning) if the writer has fallen behind.
+    """
+    try:
+        _log_queue.put_nowait((tg_id, query, via_voice, matched_song_id))
+    except asyncio.QueueFull:
+        logger.warning("Request log queue is full, dropping entry")
+
+
+async def _flush(entries: list[_Entry]) -> None:
+    tg_ids = {tg_id for tg_id, *_ in entries}
+    async with SessionLocal() as s:
+        # One lookup for every user in the batch
+        user_ids = dict(
+            (await s.execute(select(User.tg_id, User.id).where(User.tg_id.in_(tg_ids)))).all()
+        )
+        rows = [
+            {
+                "user_id": user_ids[tg_id],
+                "query": query,
+                "via_voice": via_voice,
+                "matched_song_id": matched_song_id,
+            }
+            for tg_id, query, via_voice, matched_song_id in entries
+            if tg_id in user_ids
+        ]
+        if rows:
+            # Core executemany — no ORM unit-of-work for plain log rows
+            await s.execute(insert(RequestLog), rows)
+            await s.commit()
+
+
+async def _write(retry: list[_Entry], entries: list[_Entry]) -> list[_Entry]:
+    """Write the previously failed batch and the new entries; returns what to retry next time."""
+    if retry:
+        try:
+            await _flush(retry)
+        except Exception as e:
+            # Failed twice — more likely a bad row than a DB hiccup
+            logger.error(f"Dropping {len(retry)} request logs after a retry: {e}")
+    if not entries:
+        return []
+    try:
+        await _flush(entries)
+        return []
+    except Exception as e:
+        # Analytics only — losing a batch must not stop the writer
+        logger.error(f"Failed to write {len(entries)} request logs, retrying with the next batch: {e}")
+        return entries
+
+
+async def run_request_log_writer() -> None:
+    """Background task: drain the queue and write entries in batches."""
+    loop = asyncio.get_running_loop()
+    retry: list[_Entry] = []
+    entries: list[_Entry] = []
+    try:
+        while True:
+            entries = [await _log_queue.get()]
+            # Collect up to BATCH_SIZE entries or FLUSH_INTERVAL seconds, whichever comes first
+            deadline = loop.time() + FLUSH_INTERVAL
+            while len(entries) < BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entries.append(await asyncio.wait_for(_log_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            retry = await _write(retry, entries)
+            entries = []
+    except asyncio.CancelledError:
+        # Shutting down — write the batch in hand and whatever is still queued
+        while not _log_queue.empty():
+            entries.append(_log_queue.get_nowait())
+        await _write(retry, entries)
+        raise
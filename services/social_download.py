@@ -24,22 +24,35 @@ class SocialMediaResult:
     thumbnail: str
 
 
+# Compiled once at import instead of on every title
+_UNSAFE_CHARS_RE = re.compile(r'[\\/*?:"<>|]')
+_HASHTAG_RE = re.compile(r'#\w+')
+_MENTION_RE = re.compile(r'@\w+')
+_TREND_TAGS_RE = re.compile(r'#fyp|#foryoupage|#viral|#trending|#recommendations|#рекомендации', re.IGNORECASE)
+_PLAYLIST_NOTE_RE = re.compile(r'плейлист в профиле|playlist in profile', re.IGNORECASE)
+_WS_RE = re.compile(r'\s+')
+_ARTIST_TITLE_RES = (
+    re.compile(r'^(.+?)\s*-\s*(.+)$'),  # "Artist - Title"
+    re.compile(r'^(.+?)\s*:\s*(.+)$'),  # "Artist: Title"
+)
+
+
 def sanitize(name: str) -> str:
-    return re.sub(r'[\\/*?:"<>|]', "_", name).strip()
+    return _UNSAFE_CHARS_RE.sub("_", name).strip()
 
 
 def clean_social_media_title(title: str) -> str:
     """Clean TikTok/Instagram title from hashtags, usernames, emojis, etc."""
     # Remove hashtags
-    title = re.sub(r'#\w+', '', title)
+    title = _HASHTAG_RE.sub('', title)
     # Remove @mentions/usernames
-    title = re.sub(r'@\w+', '', title)
+    title = _MENTION_RE.sub('', title)
     # Remove common TikTok/Instagram patterns
-    title = re.sub(r'#fyp|#foryoupage|#viral|#trending|#recommendations|#рекомендации', '', title, flags=re.IGNORECASE)
+    title = _TREND_TAGS_RE.sub('', title)
     # Remove "плейлист в профиле" and similar
-    title = re.sub(r'плейлист в профиле|playlist in profile', '', title, flags=re.IGNORECASE)
+    title = _PLAYLIST_NOTE_RE.sub('', title)
     # Remove multiple spaces
-    title = re.sub(r'\s+', ' ', title)
+    title = _WS_RE.sub(' ', title)
     # Remove leading/trailing spaces and special chars
     title = title.strip('.,!?-_ ')
     return title.strip()
@@ -50,13 +63,8 @@ def extract_artist_from_title(title: str) -> tuple[str, str]:
     # First clean the title
     title = clean_social_media_title(title)
     
-    patterns = [
-        r'^(.+?)\s*-\s*(.+)$',  # "Artist - Title"
-        r'^(.+?)\s*:\s*(.+)$',  # "Artist: Title"
-    ]
-    
-    for pattern in patterns:
-        match = re.match(pattern, title)
+    for pattern in _ARTIST_TITLE_RES:
+        match = pattern.match(title)
         if match:
             artist, clean_title = match.groups()
             artist = clean_social_media_title(artist)
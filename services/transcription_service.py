@@ -0,0 +1,68 @@
+"""
+Voice Transcription Service
+Offline speech-to-text for voice messages with Vosk (optional dependency).
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from typing import Optional
+
+from config import settings
+from utils.audio_tools import stream_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# Vosk model is loaded once, on the first transcription, and shared afterwards
+_vosk_model = None
+_vosk_lock = asyncio.Lock()
+
+
+async def _get_vosk_model():
+    global _vosk_model
+    async with _vosk_lock:
+        if _vosk_model is None:
+            import vosk
+            # Loading reads the whole acoustic model from disk — off the event loop
+            _vosk_model = await asyncio.to_thread(vosk.Model, settings.VOSK_MODEL_PATH)
+    return _vosk_model
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def transcribe_voice(ogg_data: bytes) -> Optional[str]:
+    """
+    Transcribe a Telegram voice message (OGG/Opus bytes).
+    
+    Returns:
+        The recognized text, or None if Vosk isn't configured or heard nothing
+    """
+    if not settings.VOSK_MODEL_PATH:
+        return None
+    
+    with tempfile.TemporaryDirectory() as td:
+        ogg_path = os.path.join(td, "voice.ogg")
+        try:
+            await asyncio.to_thread(_write_file, ogg_path, ogg_data)
+            import vosk
+            rec = vosk.KaldiRecognizer(await _get_vosk_model(), 16000)
+            
+            async def feed(data: bytes) -> None:
+                # Vosk decoding is CPU-bound C++ — keep it off the event loop
+                await asyncio.to_thread(rec.AcceptWaveform, data)
+            
+            # raw 16k mono PCM goes from ffmpeg's stdout straight into Vosk, no wav file
+            await stream_ffmpeg(
+                ["ffmpeg", "-y", "-i", ogg_path,
+                 "-f", "s16le", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", "pipe:1"],
+                feed,
+            )
+            text = json.loads(rec.FinalResult()).get("text", "").strip()
+        except Exception as e:
+            logger.error(f"Voice transcription failed: {e}")
+            return None
+    return text or None
@@ -0,0 +1,113 @@
+"""
+User Service
+Cached per-user lookups shared by the handlers.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import select, update, func
+
+from db import SessionLocal
+from models import User
+from services.cache import user_cache, user_key
+from utils.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANG = "az"
+
+# Seconds between last_seen flushes, and max tg_ids per UPDATE (SQLite caps bound parameters)
+LAST_SEEN_FLUSH_INTERVAL = 60.0
+LAST_SEEN_CHUNK = 500
+
+# tg_ids seen since the last flush — written in bulk by run_last_seen_writer
+_last_seen_dirty: set[int] = set()
+
+
+async def get_user_cached(tg_id: int) -> tuple[Optional[int], str]:
+    """
+    Return (users.id, language) for a Telegram user.
+    Unknown users come back as (None, "az").
+    Served from user_cache; the DB is only queried on a miss.
+    """
+    key = user_key(tg_id)
+    cached = user_cache.get(key)
+    if cached is not None:
+        return cached
+
+    async def _fetch() -> tuple[Optional[int], str]:
+        async with SessionLocal() as s:
+            row = (
+                await s.execute(
+                    select(User.id, User.language).where(User.tg_id == tg_id)
+                )
+            ).first()
+        result = (row.id, row.language or DEFAULT_LANG) if row else (None, DEFAULT_LANG)
+        user_cache.set(key, result)
+        return result
+
+    # One in-flight DB lookup per user; concurrent callers wait for it
+    return await single_flight(key, _fetch)
+
+
+async def get_user_lang(tg_id: int) -> str:
+    """Return the user's interface language ("az" for unknown users)."""
+    _, lang = await get_user_cached(tg_id)
+    return lang
+
+
+def remember_user(tg_id: int, user_id: int, lang: str) -> None:
+    """Store a row the caller has just written, so the next lookup needs no SELECT."""
+    user_cache.set(user_key(tg_id), (user_id, lang))
+
+
+def invalidate_user(tg_id: int) -> None:
+    """Forget the cached entry, e.g. after the user is created or changes language."""
+    user_cache.delete(user_key(tg_id))
+
+
+def touch_user(tg_id: int) -> None:
+    """Mark the user as active; last_seen is written by the background writer."""
+    _last_seen_dirty.add(tg_id)
+
+
+async def _flush_last_seen(tg_ids: list[int]) -> None:
+    async with SessionLocal() as s:
+        for i in range(0, len(tg_ids), LAST_SEEN_CHUNK):
+            await s.execute(
+                update(User)
+                .where(User.tg_id.in_(tg_ids[i:i + LAST_SEEN_CHUNK]))
+                .values(last_seen=func.now())
+            )
+        await s.commit()
+
+
+async def _flush_dirty() -> None:
+    if not _last_seen_dirty:
+        return
+    # Single event loop and no await in between — nothing can be added mid-swap
+    tg_ids = list(_last_seen_dirty)
+    _last_seen_dirty.clear()
+    try:
+        await _flush_last_seen(tg_ids)
+    except asyncio.CancelledError:
+        # Interrupted by shutdown — the final flush picks them up
+        _last_seen_dirty.update(tg_ids)
+        raise
+    except Exception as e:
+        # Keep them for the next flush instead of losing them
+        _last_seen_dirty.update(tg_ids)
+        logger.error(f"Failed to update last_seen for {len(tg_ids)} users: {e}")
+
+
+async def run_last_seen_writer() -> None:
+    """Background task: one bulk UPDATE per interval instead of a write per update."""
+    try:
+        while True:
+            await asyncio.sleep(LAST_SEEN_FLUSH_INTERVAL)
+            await _flush_dirty()
+    except asyncio.CancelledError:
+        # Shutting down — write what was collected since the last flush
+        await _flush_dirty()
+        raise
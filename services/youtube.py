@@ -8,6 +8,7 @@ from dataclasses import dataclass
 from typing import Optional, List
 import yt_dlp
 from config import settings
+from services.cache import yt_download_cache, yt_download_key
 
 logger = logging.getLogger(__name__)
 
@@ -193,6 +194,12 @@ async def search_multiple(query: str, max_results: int = 5) -> List[YTSearchResu
 
 async def search_and_download(query: str) -> Optional[YTResult]:
     """Search on YouTube and download the first result."""
+    # Same query again (e.g. a re-recognized clip) - reuse the file if it is still there
+    cache_key = yt_download_key(query)
+    cached = yt_download_cache.get(cache_key)
+    if cached is not None and await asyncio.to_thread(os.path.exists, cached.file_path):
+        return cached
+
     loop = asyncio.get_running_loop()
     
     def _search_and_download():
@@ -264,7 +271,10 @@ async def search_and_download(query: str) -> Optional[YTResult]:
                 logger.error(f"yt-dlp search and download error for query '{query}': {e}")
                 return None
 
-    return await loop.run_in_executor(None, _search_and_download)
+    result = await loop.run_in_executor(None, _search_and_download)
+    if result:
+        yt_download_cache.set(cache_key, result)
+    return result
 
 async def download_from_url(url: str) -> Optional[YTResult]:
     """Download a song from a YouTube URL with improved error handling and retries."""
@@ -330,13 +340,13 @@ async def download_from_url(url: str) -> Optional[YTResult]:
                 ]
                 
                 # Also check the filename that yt-dlp might have used
+                downloaded_file = None
                 if 'requested_downloads' in entry:
                     for download in entry['requested_downloads']:
                         if os.path.exists(download['filepath']):
                             downloaded_file = download['filepath']
                             break
                 else:
-                    downloaded_file = None
                     for path in possible_paths:
                         if os.path.exists(path):
                             downloaded_file = path
@@ -363,7 +373,7 @@ async def download_from_url(url: str) -> Optional[YTResult]:
                 title = title.replace('[MUSIC]', '').replace('(Official Video)', '').strip()
                 
                 return YTResult(
-                    file_path=downleted_file,
+                    file_path=downloaded_file,
                     title=title,
                     artist=artist,
                     duration=int(entry.get('duration', 0)),
@@ -387,5 +397,3 @@ async def download_from_url(url: str) -> Optional[YTResult]:
         return None
     
     return await _download_with_retry()
-
-    return await loop.run_in_executor(None, _download)
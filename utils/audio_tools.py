@@ -1,30 +1,130 @@
 """
 Audio processing utilities for music recognition
 """
+import asyncio
 import os
 import subprocess
 import tempfile
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
 logger = logging.getLogger(__name__)
 
+# Max seconds a single ffmpeg run may take before it is killed
+FFMPEG_TIMEOUT = 60
 
-def extract_audio_from_video(
+# Concurrent ffmpeg processes, each limited to one thread - one core stays free
+# for the event loop, and a burst of voice/video messages queues up instead of
+# oversubscribing the CPU
+FFMPEG_MAX_PROCS = max(1, (os.cpu_count() or 2) - 1)
+_ffmpeg_slots = asyncio.Semaphore(FFMPEG_MAX_PROCS)
+
+
+def _single_threaded(cmd: list[str]) -> list[str]:
+    """
+    Limit every stage of the command to one thread. -threads is per-file:
+    before -i it only caps the decoder, so it is repeated in front of the
+    output (the last argument) for the encoder; -filter_threads caps the
+    filter graph.
+    """
+    return [cmd[0], "-filter_threads", "1", "-threads", "1", *cmd[1:-1], "-threads", "1", cmd[-1]]
+
+
+async def run_ffmpeg(
+    cmd: list[str],
+    timeout: float = FFMPEG_TIMEOUT,
+    capture_output: bool = False,
+) -> bytes:
+    """
+    Run an ffmpeg command without blocking the event loop.
+    
+    Args:
+        cmd: Full command line, starting with "ffmpeg"
+        timeout: Seconds before the process is killed
+        capture_output: Return what ffmpeg writes to stdout (e.g. "pipe:1" output)
+    
+    Returns:
+        ffmpeg's stdout if capture_output is set, otherwise b""
+    
+    Raises:
+        subprocess.CalledProcessError: ffmpeg exited with a non-zero code
+        asyncio.TimeoutError: ffmpeg ran longer than timeout (the process is killed)
+    """
+    async with _ffmpeg_slots:
+        proc = await asyncio.create_subprocess_exec(
+            *_single_threaded(cmd),
+            stdout=asyncio.subprocess.PIPE if capture_output else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        finally:
+            # Timed out or the caller was cancelled - don't leave ffmpeg running
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return stdout or b""
+
+
+async def stream_ffmpeg(
+    cmd: list[str],
+    on_chunk: Callable[[bytes], Awaitable[None]],
+    chunk_size: int = 4000,
+    timeout: float = FFMPEG_TIMEOUT,
+) -> None:
+    """
+    Run an ffmpeg command that writes to stdout ("pipe:1") and hand each
+    chunk to on_chunk as soon as it is produced, so the consumer works
+    while ffmpeg is still decoding.
+    
+    Raises:
+        subprocess.CalledProcessError: ffmpeg exited with a non-zero code
+        asyncio.TimeoutError: the whole run took longer than timeout (the process is killed)
+    """
+    async with _ffmpeg_slots:
+        proc = await asyncio.create_subprocess_exec(
+            *_single_threaded(cmd),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        
+        async def _pump() -> None:
+            while data := await proc.stdout.read(chunk_size):
+                await on_chunk(data)
+            await proc.wait()
+        
+        try:
+            await asyncio.wait_for(_pump(), timeout=timeout)
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+async def extract_audio_from_video(
     video_path: str,
     output_path: Optional[str] = None,
     duration: Optional[int] = None,
-    start_time: int = 0
+    start_time: int = 0,
+    sample_rate: int = 16000
 ) -> Optional[str]:
     """
     Extract audio from video file using FFmpeg.
     
+    Only the first audio stream is read and the video stream is never decoded;
+    with -ss/-t placed before -i, ffmpeg seeks and stops at the input level.
+    
     Args:
         video_path: Path to video file
         output_path: Output audio file path (optional)
         duration: Extract only first N seconds (optional)
         start_time: Start time in seconds (default: 0)
+        sample_rate: Output sample rate in Hz (default: 16000, enough for fingerprinting)
     
     Returns:
         Path to extracted audio file or None on error
@@ -40,15 +140,68 @@ def extract_audio_from_video(
         )
     
     # FFmpeg command for audio extraction
-    # Format: 16-bit PCM WAV, mono, 44.1 kHz (optimal for recognition)
-    cmd = [
-        "ffmpeg", "-y",
+    # Format: 16-bit PCM WAV, mono, 16 kHz by default (recognition-sized)
+    cmd = ["ffmpeg", "-y"]
+    
+    if start_time > 0:
+        cmd.extend(["-ss", str(start_time)])
+    
+    if duration:
+        cmd.extend(["-t", str(duration)])
+    
+    cmd.extend([
         "-i", video_path,
+        "-map", "0:a:0",  # First audio stream only
         "-vn",  # No video
         "-acodec", "pcm_s16le",  # 16-bit PCM
-        "-ar", "44100",  # 44.1 kHz sample rate
+        "-ar", str(sample_rate),
         "-ac", "1",  # Mono
-    ]
+        "-f", "wav",
+    ])
+    
+    cmd.append(output_path)
+    
+    try:
+        await run_ffmpeg(cmd)
+        return output_path
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg error: {e}")
+        return None
+    except asyncio.TimeoutError:
+        logger.error(f"FFmpeg timed out extracting audio from {video_path}")
+        return None
+    except FileNotFoundError:
+        logger.error("FFmpeg not found")
+        return None
+
+
+async def extract_audio_bytes(
+    video_path: str,
+    duration: Optional[int] = None,
+    start_time: int = 0,
+    bitrate: str = "192k"
+) -> Optional[bytes]:
+    """
+    Extract audio from video file as in-memory mono MP3 using FFmpeg.
+    
+    ffmpeg writes to stdout (pipe:1), so no intermediate audio file is
+    created. The video itself still has to be a file: MP4 demuxing needs
+    a seekable input.
+    
+    Args:
+        video_path: Path to video file
+        duration: Extract only first N seconds (optional)
+        start_time: Start time in seconds (default: 0)
+        bitrate: MP3 bitrate (default: 192k)
+    
+    Returns:
+        MP3 bytes or None on error
+    """
+    if not os.path.exists(video_path):
+        logger.error(f"Video file not found: {video_path}")
+        return None
+    
+    cmd = ["ffmpeg", "-y"]
     
     if start_time > 0:
         cmd.extend(["-ss", str(start_time)])
@@ -56,25 +209,32 @@ def extract_audio_from_video(
     if duration:
         cmd.extend(["-t", str(duration)])
     
-    cmd.append(output_path)
+    cmd.extend([
+        "-i", video_path,
+        "-map", "0:a:0",  # First audio stream only
+        "-vn",  # No video
+        "-ac", "1",  # Mono - recognition doesn't need stereo
+        "-acodec", "libmp3lame",
+        "-b:a", bitrate,
+        "-f", "mp3",
+        "pipe:1",
+    ])
     
     try:
-        subprocess.run(
-            cmd,
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        return output_path
+        audio_data = await run_ffmpeg(cmd, capture_output=True)
+        return audio_data or None
     except subprocess.CalledProcessError as e:
         logger.error(f"FFmpeg error: {e}")
         return None
+    except asyncio.TimeoutError:
+        logger.error(f"FFmpeg timed out extracting audio from {video_path}")
+        return None
     except FileNotFoundError:
         logger.error("FFmpeg not found")
         return None
 
 
-def convert_audio_format(
+async def convert_audio_format(
     input_path: str,
     output_path: Optional[str] = None,
     format: str = "wav",
@@ -117,22 +277,20 @@ def convert_audio_format(
     cmd.append(output_path)
     
     try:
-        subprocess.run(
-            cmd,
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
+        await run_ffmpeg(cmd)
         return output_path
     except subprocess.CalledProcessError as e:
         logger.error(f"FFmpeg conversion error: {e}")
         return None
+    except asyncio.TimeoutError:
+        logger.error(f"FFmpeg timed out converting {input_path}")
+        return None
     except FileNotFoundError:
         logger.error("FFmpeg not found")
         return None
 
 
-def extract_audio_segment(
+async def extract_audio_segment(
     audio_path: str,
     start_time: int = 0,
     duration: int = 30,
@@ -168,16 +326,14 @@ def extract_audio_segment(
     ]
     
     try:
-        subprocess.run(
-            cmd,
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
+        await run_ffmpeg(cmd)
         return output_path
     except subprocess.CalledProcessError as e:
         logger.error(f"FFmpeg segment extraction error: {e}")
         return None
+    except asyncio.TimeoutError:
+        logger.error(f"FFmpeg timed out extracting a segment from {audio_path}")
+        return None
     except FileNotFoundError:
         logger.error("FFmpeg not found")
         return None
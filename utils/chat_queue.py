@@ -0,0 +1,49 @@
+"""
+Per-chat work queues.
+Jobs from one chat run one after another (replies keep their order),
+while different chats are processed in parallel.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# A chat's worker exits after this many idle seconds
+IDLE_TIMEOUT = 60.0
+
+_chat_queues: dict[int, asyncio.Queue] = {}
+_workers: set[asyncio.Task] = set()  # strong refs so running workers aren't GC'd
+
+
+def run_in_chat(chat_id: int, job: Callable[[], Awaitable[None]]) -> None:
+    """Queue job() on the chat's worker, starting one if the chat has none."""
+    queue = _chat_queues.get(chat_id)
+    if queue is None:
+        queue = _chat_queues[chat_id] = asyncio.Queue()
+        task = asyncio.create_task(_worker(chat_id, queue))
+        _workers.add(task)
+        task.add_done_callback(_workers.discard)
+    queue.put_nowait(job)
+
+
+async def _worker(chat_id: int, queue: asyncio.Queue) -> None:
+    try:
+        while True:
+            try:
+                job = await asyncio.wait_for(queue.get(), IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                # No await between the check and the exit, so no job can slip in
+                if queue.empty():
+                    return
+                continue
+
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"Chat {chat_id} job failed: {e}", exc_info=True)
+    finally:
+        # Idle exit, cancellation or a BaseException - either way later jobs
+        # must start a new worker instead of queueing behind a dead one
+        if _chat_queues.get(chat_id) is queue:
+            del _chat_queues[chat_id]
@@ -1,6 +1,15 @@
+import asyncio
+import os
 import shutil
 from datetime import timedelta
+from functools import lru_cache
 
+# FSInputFile streams uploads from disk via aiofiles; bigger reads mean
+# fewer round-trips through the event loop for multi-MB audio files
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# ffmpeg doesn't appear or vanish while the bot runs - scan PATH once
+@lru_cache(maxsize=1)
 def has_ffmpeg() -> bool:
     return shutil.which("ffmpeg") is not None
 
@@ -10,4 +19,13 @@ def ensure_ffmpeg():
 
 def seconds_to_hms(s: int) -> str:
     td = timedelta(seconds=s or 0)
-    return str(td)
\ No newline at end of file
+    return str(td)
+
+
+# Filesystem checks for async handlers - run the stat in a worker thread
+# so a slow disk doesn't stall the event loop
+async def path_exists(path: str) -> bool:
+    return await asyncio.to_thread(os.path.exists, path)
+
+async def path_size(path: str) -> int:
+    return await asyncio.to_thread(os.path.getsize, path)
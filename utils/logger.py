@@ -1,7 +1,8 @@
 import os
-import datetime
+import sys
+import time
 import asyncio
-import inspect
+import logging
 
 # 📁 Log qovluğu
 LOG_DIR = "logs"
@@ -10,10 +11,15 @@ LOG_FILE = os.path.join(LOG_DIR, "lyrica.log")
 # Qovluğu yoxla/yarat
 os.makedirs(LOG_DIR, exist_ok=True)
 
-
-def _timestamp() -> str:
-    """UTC formatında zaman möhürü"""
-    return datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+# Hadisələr fayla standart logging ilə yazılır; konsola root logger (app.py) çıxarır.
+# Zaman möhürünü hər handler öz formatter-i ilə əlavə edir — mesajda təkrarlanmır
+_logger = logging.getLogger("lyrica.events")
+_logger.setLevel(logging.INFO)
+_file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+_file_formatter = logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+_file_formatter.converter = time.gmtime  # UTC
+_file_handler.setFormatter(_file_formatter)
+_logger.addHandler(_file_handler)
 
 
 def log_event(level: str, message: str):
@@ -22,22 +28,15 @@ def log_event(level: str, message: str):
     level: INFO / WARNING / ERROR / PERF
     message: hadisə mətni
     """
-    frame = inspect.stack()[1]
-    caller = os.path.basename(frame.filename)
-    line = frame.lineno
-
-    ts = _timestamp()
-    entry = f"[{ts}] [{level.upper()}] ({caller}:{line}) {message}"
-
-    # Konsolda da göstər
-    print(entry)
-
-    # Fayla yaz
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(entry + "\n")
-    except Exception:
-        pass
+    # inspect.stack() bütün stack-in mənbə kodunu oxuyur — yalnız çağıranın frame-i lazımdır
+    frame = sys._getframe(1)
+    caller = os.path.basename(frame.f_code.co_filename)
+    line = frame.f_lineno
+
+    entry = f"[{level.upper()}] ({caller}:{line}) {message}"
+
+    # PERF kimi xüsusi səviyyələr INFO kimi yazılır
+    _logger.log(getattr(logging, level.upper(), logging.INFO), entry)
 
 
 async def log_perf(section: str, start_time: float):
@@ -0,0 +1,33 @@
+"""
+Single-flight calls.
+Concurrent callers asking for the same key share one in-flight fetch
+instead of each running their own; the entry is dropped once it completes.
+"""
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Cache key -> the task fetching it. Keys are the services.cache *_key()
+# strings, so their prefixes keep different caches apart.
+_in_flight: dict[str, asyncio.Task] = {}
+
+
+def _forget(key: str, task: asyncio.Task) -> None:
+    if _in_flight.get(key) is task:
+        del _in_flight[key]
+    # Every waiter may have been cancelled - mark the error as retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+async def single_flight(key: str, fetch: Callable[[], Awaitable[T]]) -> T:
+    """
+    Await fetch() for key, joining the call already in flight if there is one.
+    A cancelled caller doesn't cancel the shared fetch for the others.
+    """
+    task = _in_flight.get(key)
+    if task is None:
+        task = _in_flight[key] = asyncio.ensure_future(fetch())
+        task.add_done_callback(lambda done: _forget(key, done))
+    return await asyncio.shield(task)